@@ -1,5 +1,26 @@
 import argparse
+import copy
 import pathlib
+from typing import List
+
+
+def int_or_auto(value: str) -> int | str:
+    if value.lower() == "auto":
+        return "auto"
+    return int(value)
+
+
+def cpu_split(value: str) -> float | str:
+    """Share of the CPUs for HDR processing from a ratio such as 3:1 of HDR to encoder CPUs, or "auto"."""
+    if value.lower() == "auto":
+        return "auto"
+    try:
+        hdr, encoder = (float(part) for part in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected "auto" or a ratio such as 3:1, got "{value}"')
+    if hdr <= 0 or encoder <= 0:
+        raise argparse.ArgumentTypeError(f'both sides of the ratio must be positive, got "{value}"')
+    return hdr / (hdr + encoder)
 
 
 class CommandLineParser:
@@ -53,6 +74,14 @@ class CommandLineParser:
             default="best",
             help='Quality of generated video file - allowed values "preview", "good", "better", "best" - default is "best"'
         )
+        self.parser.add_argument(
+            '--rendition',
+            dest="renditions",
+            type=str,
+            action="append",
+            default=None,
+            help='Additional video encoded from the same processed frames, given as QUALITY[:FORMAT][:WIDTHxHEIGHT], e.g. "preview:mp4:960x540" - written to "<name>-<quality>[-<width>x<height>]" - can be given several times - default is no additional video'
+        )
         self.parser.add_argument(
             '-fps', '--frames-per-second',
             dest="fps",
@@ -79,20 +108,145 @@ class CommandLineParser:
             help='Flip frame vertically'
         )
         self.parser.add_argument(
-            '-w', '--number-of-workers',
+            '-w', '--number-of-workers', '--workers',
             dest="num_workers",
-            type=int,
+            type=int_or_auto,
             nargs='?',
             default=8,
-            help='Number of parallel worker threads - default is 8 - affects speed of assembly'
+            help='Number of parallel worker threads, or "auto" for one per CPU, fewer if their memory does not fit (see --memory-limit) - default is 8 - affects speed of assembly'
+        )
+        self.parser.add_argument(
+            '-x', '--executor',
+            dest="executor",
+            type=str,
+            choices=["thread", "process"],
+            default="thread",
+            help='Run frame processing in worker "thread"s or in worker "process"es sharing frame buffers with the main process - default is "thread"'
+        )
+        self.parser.add_argument(
+            '-pf', '--pipe-format',
+            dest="pipe_format",
+            type=str,
+            choices=["bgr24", "yuv420p"],
+            default="bgr24",
+            help='Pixel format of frames sent to ffmpeg - "yuv420p" converts frames in the worker threads and halves the data sent to ffmpeg - default is "bgr24"'
+        )
+        self.parser.add_argument(
+            '--sink',
+            dest="sink",
+            type=str,
+            choices=["ffmpeg", "null", "raw"],
+            default="ffmpeg",
+            help='Where the processed frames go - "ffmpeg" encodes the video, "null" drops the frames to measure loading and HDR processing without an encoder, "raw" writes them in the pipe format to NAME.bgr24 or NAME.yuv420p in the output path - default is "ffmpeg"'
+        )
+        self.parser.add_argument(
+            '-s', '--segments',
+            dest="segments",
+            type=int,
+            nargs='?',
+            default=1,
+            help='Split the frames into this many contiguous ranges, encode them in parallel and join them losslessly - default is 1'
+        )
+        self.parser.add_argument(
+            '-cf', '--checkpoint-frames',
+            dest="checkpoint_frames",
+            type=int,
+            nargs='?',
+            default=2400,
+            help='Encode the video in committed parts of this many frames, recorded in a journal next to the output - 0 encodes in one go without checkpoints - default is 2400'
+        )
+        self.parser.add_argument(
+            '-r', '--resume',
+            dest="resume",
+            action="store_true",
+            default=False,
+            help='Resume an interrupted run - frame ranges recorded in the journal are not processed again'
+        )
+        self.parser.add_argument(
+            '-f', '--follow',
+            dest="follow",
+            action="store_true",
+            default=False,
+            help='Start encoding while beck-view-digitalize is still writing frames to the input directory'
+        )
+        self.parser.add_argument(
+            '--follow-sentinel',
+            dest="follow_sentinel",
+            type=str,
+            default="beck-view-digitalize.done",
+            help='File in the input directory that marks the end of digitizing in follow mode - default is "beck-view-digitalize.done"'
+        )
+        self.parser.add_argument(
+            '--follow-timeout',
+            dest="follow_timeout",
+            type=float,
+            default=60.0,
+            help='Seconds without new frames after which follow mode finishes - default is 60'
+        )
+        self.parser.add_argument(
+            '--frame-cache',
+            dest="frame_cache",
+            type=pathlib.Path,
+            default=None,
+            help='Directory for a cache of processed frames - encoding the same reel again with another quality or output format skips decoding and HDR processing - default is no cache'
+        )
+        self.parser.add_argument(
+            '--frame-cache-size',
+            dest="frame_cache_size",
+            type=float,
+            default=20.0,
+            help='Maximum size of the frame cache in GB - least recently used reels are removed first - default is 20'
+        )
+        self.parser.add_argument(
+            '--proxy',
+            dest="proxy",
+            type=int,
+            choices=[1, 2, 4],
+            default=1,
+            help='Render a quick review proxy at 1/N of the frame size - frames are decoded reduced and HDR runs at the reduced size, the output is named "<name>-proxy" - default is 1, the full size'
+        )
+        self.parser.add_argument(
+            '--proxy-step',
+            dest="proxy_step",
+            type=int,
+            default=1,
+            help='Proxy of every Nth frame only - the frame rate is divided by N, so the proxy keeps the running time of the reel - default is 1, every frame'
         )
         self.parser.add_argument(
             '-bs', '--batch-size',
             dest="batch_size",
-            type=int,
+            type=int_or_auto,
             nargs='?',
             default=100,
-            help='Batch size for each worker thread - default is 100 - affects speed of assembly'
+            help='Maximum number of images in flight in the processing pipeline, or "auto" to size it from a warm-up measurement of the frames and the memory - default is 100 - affects memory usage and speed of assembly'
+        )
+        self.parser.add_argument(
+            '--read-ahead',
+            dest="read_ahead",
+            type=int,
+            default=24,
+            help='Number of image files read ahead of decoding into reusable buffers, so decoding does not wait for slow storage such as a NAS - 0 reads every file in the thread decoding it - not used with --executor process - default is 24'
+        )
+        self.parser.add_argument(
+            '--read-threads',
+            dest="read_threads",
+            type=int,
+            default=4,
+            help='Number of threads reading image files ahead of decoding - more threads hide more latency of network storage - default is 4'
+        )
+        self.parser.add_argument(
+            '--cpu-split',
+            dest="cpu_split",
+            type=cpu_split,
+            default=None,
+            help='Split the CPUs between HDR processing and the x264 encoders by a ratio such as 3:1, or "auto" to measure the ratio on a frame of the reel - HDR workers and encoders are pinned to their CPUs where the platform supports it, x264 gets a matching thread count and --workers auto no more workers than HDR CPUs - default is to share all CPUs'
+        )
+        self.parser.add_argument(
+            '--memory-limit',
+            dest="memory_limit",
+            type=float,
+            default=None,
+            help='Memory in GB for the frames in flight, the workers and the encoders of a reel - workers and images in flight are reduced to fit, and reduced further while running if memory runs short - default is three quarters of the available memory with "auto", otherwise no limit'
         )
         self.parser.add_argument(
             '-wh', '--width-height',
@@ -120,42 +274,50 @@ class CommandLineParser:
         self.parser.add_argument(
             "--drago-bias",
             type=float,
-            default=2.2
+            default=None,
+            help='Bias of the Drago tone mapper - default is 2.2 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--reinhard-gamma",
             type=float,
-            default=1.0
+            default=None,
+            help='Gamma of the Reinhard tone mapper - default is 1.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--reinhard-intensity",
             type=float,
-            default=0.0
+            default=None,
+            help='Intensity of the Reinhard tone mapper - default is 0.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--reinhard-light-adapt",
             type=float,
-            default=1.0
+            default=None,
+            help='Light adaptation of the Reinhard tone mapper - default is 1.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--reinhard-color-adapt",
             type=float,
-            default=0.0
+            default=None,
+            help='Color adaptation of the Reinhard tone mapper - default is 0.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--mantiuk-scale",
             type=float,
-            default=1.0
+            default=None,
+            help='Contrast scale of the Mantiuk tone mapper - default is 1.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--mantiuk-saturation",
             type=float,
-            default=1.0
+            default=None,
+            help='Saturation of the Mantiuk tone mapper - default is 1.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--mantiuk-bias",
             type=float,
-            default=1.0
+            default=None,
+            help='Bias of the Mantiuk tone mapper - default is 1.0 or the value of the tone mapper preset'
         ),
         self.parser.add_argument(
             "--tone-mapper-preset",
@@ -163,6 +325,145 @@ class CommandLineParser:
             choices=["default", "cinematic", "natural", "highlight", "soft", "vivid", "neutral"],
             default="default"
         ),
+        self.parser.add_argument(
+            "--sweep",
+            type=str,
+            nargs='*',
+            choices=["default", "cinematic", "natural", "highlight", "soft", "vivid", "neutral"],
+            default=None,
+            help='Compare tone mapper presets instead of assembling the video - each frame is merged once and tone mapped with every given preset (all presets if none are given) - needs --bracketing'
+        )
+        self.parser.add_argument(
+            "--sweep-frames",
+            type=int,
+            default=12,
+            help='Number of frames sampled across the reel for a contact sheet per preset - default is 12'
+        )
+        self.parser.add_argument(
+            "--sweep-range",
+            type=str,
+            default=None,
+            help='Frame range START:END to encode as one clip per preset instead of contact sheets of sampled frames - default is no range'
+        )
+        self.parser.add_argument(
+            "--hdr-mode",
+            type=str,
+            choices=["debevec", "fusion"],
+            default="debevec",
+            help='How bracketed exposures are combined - "debevec" merges them into a radiance map and tone maps it, "fusion" blends them directly with Mertens exposure fusion (no response curve, no tone mapper) - default is "debevec"'
+        )
+        self.parser.add_argument(
+            "--fusion-scale",
+            type=int,
+            choices=[1, 2, 4],
+            default=2,
+            help='Exposure fusion computes its weight maps at 1/N of the frame resolution - 1 uses cv2.MergeMertens at full resolution - default is 2'
+        )
+        self.parser.add_argument(
+            "--gate",
+            type=str,
+            choices=["fixed", "auto"],
+            default="fixed",
+            help='Picture area of the frames - "fixed" crops 230 columns on both sides of bracketed frames, "auto" detects the film gate in frames sampled across the reel (kept in film_gate.json next to the frames) and crops it in both modes - default is "fixed"'
+        )
+        self.parser.add_argument(
+            "--gate-output",
+            dest="gate_output",
+            type=str,
+            choices=["reflect", "black", "crop"],
+            default="reflect",
+            help='What surrounds the cropped picture in the video - "reflect" pads it back to the frame size by mirroring the picture, "black" pads it with flat black, which costs almost no bitrate, "crop" encodes only the picture at its cropped size - default is "reflect"'
+        )
+        self.parser.add_argument(
+            "--duplicate-tolerance",
+            dest="duplicate_tolerance",
+            type=float,
+            default=0.0,
+            help='Reuse the processed frame of the previous frame for a frame that looks the same - no pixel of 64x48 thumbnails of its exposures differs by more than this many of 255 levels (e.g. 2) - decoding still runs, merge and tone mapping are skipped - the runs of duplicates are listed in NAME.duplicates.json - 0 processes every frame - default is 0'
+        )
+        self.parser.add_argument(
+            "--merge-engine",
+            type=str,
+            choices=["opencv", "lut"],
+            default="opencv",
+            help='HDR merge implementation - "opencv" uses cv2.MergeDebevec, "lut" uses NumPy lookup tables for 8-bit exposures - default is "opencv"'
+        )
+        self.parser.add_argument(
+            "--calibration",
+            type=str,
+            choices=["reel", "frame"],
+            default="reel",
+            help='Estimate the camera response curve once per "reel" (cached in camera_response.json next to the frames) or for every "frame" - default is "reel"'
+        )
+        self.parser.add_argument(
+            "--calibration-samples",
+            type=int,
+            default=8,
+            help='Number of frames sampled across the reel for the camera response curve - default is 8'
+        )
+        self.parser.add_argument(
+            "--recalibrate",
+            action="store_true",
+            default=False,
+            help='Ignore a cached camera response curve and estimate it again'
+        )
+        self.parser.add_argument(
+            '--batch',
+            dest="batch",
+            type=pathlib.Path,
+            default=None,
+            help='Job file with one reel per line, given as the options of this program (e.g. "-p scans/reel01 -n reel01 -b") - options not given for a reel keep the values of this command line - default is no batch'
+        )
+        self.parser.add_argument(
+            '--batch-cpus',
+            dest="batch_cpus",
+            type=int,
+            default=None,
+            help='Number of frames all reels of a batch may decode and process at the same time - default is the number of CPUs'
+        )
+        self.parser.add_argument(
+            '--batch-encoder-slots',
+            dest="batch_encoder_slots",
+            type=int,
+            default=2,
+            help='Number of reels of a batch encoded at the same time - default is 2'
+        )
+        self.parser.add_argument(
+            '--batch-summary',
+            dest="batch_summary",
+            type=pathlib.Path,
+            default=None,
+            help='JSON file for the timings of every reel of a batch - default is the job file with the suffix ".summary.json"'
+        )
+        self.parser.add_argument(
+            '--metrics-interval',
+            dest="metrics_interval",
+            type=float,
+            default=0.0,
+            help='Log the time spent in every stage and the depth of every queue as one "metrics key=value ..." line every N seconds - 0 only logs a summary at the end - default is 0'
+        )
+        self.parser.add_argument(
+            '--metrics-file',
+            dest="metrics_file",
+            type=pathlib.Path,
+            default=None,
+            help='Prometheus textfile (e.g. for the node_exporter textfile collector) updated with the stage and queue metrics while running - default is none'
+        )
+        self.parser.add_argument(
+            '--trace',
+            dest="trace",
+            type=pathlib.Path,
+            default=None,
+            help='Write every timed stage of every frame as a Chrome trace JSON file (chrome://tracing or ui.perfetto.dev) - default is none'
+        )
+        self.parser.add_argument(
+            '--profile',
+            dest="profile",
+            type=pathlib.Path,
+            default=None,
+            help='Profile the frame loading and processing workers with cProfile and write the statistics to this file. '
+                 'From Python 3.12 on one profiler covers the whole process, so the statistics also include the main and encoder threads - default is none'
+        )
         self.parser.add_argument(
             '-g', '--gui',
             dest="gui",
@@ -174,3 +475,17 @@ class CommandLineParser:
     def parse_args(self) -> argparse.Namespace:
         # Parse arguments and return the namespace
         return self.parser.parse_args()
+
+    def parse_job_args(self, job_args: List[str], defaults: argparse.Namespace) -> argparse.Namespace:
+        # argparse only fills in defaults that are missing from the namespace, so options not given
+        # for a job keep the values of the batch command line
+        args = self.parser.parse_args(job_args, namespace=copy.copy(defaults))
+        args.batch = None
+        return args
+
+    def job_sets(self, job_args: List[str], dest: str, defaults: argparse.Namespace) -> bool:
+        """Whether the options of a job give the option stored in ``dest`` themselves."""
+        marker = object()
+        namespace = copy.copy(defaults)
+        setattr(namespace, dest, marker)
+        return getattr(self.parser.parse_args(job_args, namespace=namespace), dest) is not marker
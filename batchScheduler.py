@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import pathlib
+import shlex
+import threading
+import time
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from CommandLineParser import CommandLineParser
+from createVideo import GenerateVideo
+
+
+def read_job_file(path: pathlib.Path) -> List[List[str]]:
+    """Returns the options of every job - one job per line, empty lines and lines starting with # are skipped."""
+    jobs = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # Keep the backslashes of Windows paths
+        tokens = shlex.split(line, posix=os.name != "nt")
+        jobs.append([t[1:-1] if len(t) > 1 and t[0] == t[-1] and t[0] in "\"'" else t for t in tokens])
+    return jobs
+
+
+class BatchScheduler:
+    """Assembles the reels of a job file with one CPU budget shared by all reels.
+
+    Up to ``encoder_slots`` reels run at the same time. Frame loading and HDR processing of all of
+    them draw from one pool of ``cpus`` slots, so reels never oversubscribe the machine, while a
+    reel in a single threaded phase (indexing, calibration, joining segments) leaves its share of
+    the CPUs to the others.
+    """
+
+    def __init__(self, command_line_parser: CommandLineParser, args: Namespace) -> None:
+        self.command_line_parser = command_line_parser
+        self.args = args
+        self.job_file: pathlib.Path = args.batch
+        self.cpus: int = max(1, args.batch_cpus or os.cpu_count() or 1)
+        self.encoder_slots: int = max(1, args.batch_encoder_slots)
+        self.summary_file: pathlib.Path = args.batch_summary or self.job_file.with_suffix(".summary.json")
+
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger(__name__)
+
+    def _job_args(self, index: int, job: List[str], cpu_slots: threading.Semaphore) -> Namespace:
+        args = self.command_line_parser.parse_job_args(job, self.args)
+        args.job_name = f"job{index + 1}-{os.path.splitext(str(args.name))[0]}"
+        args.cpu_slots = cpu_slots
+        # Worker threads only wait for CPU slots - enough of them to use the whole budget alone,
+        # unless the job asks for its own number of workers
+        if not self.command_line_parser.job_sets(job, "num_workers", self.args):
+            args.num_workers = self.cpus
+        # Reels running side by side share the available memory
+        args.memory_share = self.encoder_slots
+        return args
+
+    def _run_job(self, index: int, args: Namespace, submitted: float) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result: Dict[str, Any] = {
+            "job": index + 1,
+            "name": args.job_name,
+            "input": str(args.path),
+            "status": "ok",
+            "frames": 0,
+            "queued_s": round(started - submitted, 3),
+        }
+        self.logger.info(f"Starting {args.job_name} from {str(args.path)}")
+
+        setup_done = started
+        try:
+            generator = GenerateVideo(args)
+            setup_done = time.perf_counter()
+            if args.sweep is not None:
+                generator.sweep_tone_mappers()
+            else:
+                generator.assemble_video()
+            result["frames"] = generator.frames_written
+        except Exception as e:
+            self.logger.exception(f"{args.job_name} failed")
+            result["status"] = "failed"
+            result["error"] = str(e)
+
+        finished = time.perf_counter()
+        result["setup_s"] = round(setup_done - started, 3)
+        result["assembly_s"] = round(finished - setup_done, 3)
+        result["total_s"] = round(finished - started, 3)
+        result["fps"] = round(result["frames"] / result["assembly_s"], 2) if result["assembly_s"] > 0 else None
+        return result
+
+    def run(self) -> bool:
+        jobs = read_job_file(self.job_file)
+        cpu_slots = threading.BoundedSemaphore(self.cpus)
+        # Parse every job up front, so a typo in the last line does not surface hours into the batch
+        job_args = [self._job_args(index, job, cpu_slots) for index, job in enumerate(jobs)]
+
+        self.logger.info(f"Batch of {len(jobs)} reels from {str(self.job_file)} - {self.cpus} CPU slots, "
+                         f"{self.encoder_slots} reels at a time")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.encoder_slots) as executor:
+            submitted = time.perf_counter()
+            futures = [executor.submit(self._run_job, index, args, submitted) for index, args in enumerate(job_args)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        self._write_summary(results, elapsed)
+        return all(result["status"] == "ok" for result in results)
+
+    def _write_summary(self, results: List[Dict[str, Any]], elapsed: float) -> None:
+        self.logger.info(f"{'job':<32}{'status':>8}{'frames':>8}{'queued s':>10}{'setup s':>10}{'assembly s':>12}{'fps':>8}")
+        for r in results:
+            fps = f"{r['fps']:.2f}" if r["fps"] is not None else "-"
+            self.logger.info(f"{r['name']:<32}{r['status']:>8}{r['frames']:>8}{r['queued_s']:>10.1f}"
+                             f"{r['setup_s']:>10.1f}{r['assembly_s']:>12.1f}{fps:>8}")
+        self.logger.info(f"Batch finished in {elapsed:.1f} s")
+
+        summary = {
+            "job_file": str(self.job_file),
+            "cpus": self.cpus,
+            "encoder_slots": self.encoder_slots,
+            "elapsed_s": round(elapsed, 3),
+            "reels": results,
+        }
+        try:
+            self.summary_file.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+            self.logger.info(f"Batch summary written to {str(self.summary_file)}")
+        except OSError as e:
+            self.logger.warning(f"Could not write batch summary to {str(self.summary_file)} - {e}")
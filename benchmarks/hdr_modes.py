@@ -0,0 +1,97 @@
+"""Compares the HDR modes of beck-view-movie on synthetic bracketed frames.
+
+Every configuration runs in a fresh process, processes the same decoded frame groups one after the
+other and reports frames per second and the growth of the peak resident set size while processing,
+i.e. the working memory of one frame in flight.
+
+    python benchmarks/hdr_modes.py --frames 24 --width 1920 --height 1080
+"""
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from measure import ROOT, environment, peak_rss_bytes
+from synthetic import write_frame_set
+
+sys.path.insert(0, str(ROOT))
+
+CONFIGURATIONS = {
+    "debevec": ["--hdr-mode", "debevec", "--merge-engine", "opencv"],
+    "debevec-lut": ["--hdr-mode", "debevec", "--merge-engine", "lut"],
+    "fusion-1": ["--hdr-mode", "fusion", "--fusion-scale", "1"],
+    "fusion-2": ["--hdr-mode", "fusion", "--fusion-scale", "2"],
+    "fusion-4": ["--hdr-mode", "fusion", "--fusion-scale", "4"],
+}
+
+
+def run_configuration(path: pathlib.Path, name: str) -> dict:
+    from CommandLineParser import CommandLineParser
+    from createVideo import GenerateVideo
+
+    args = CommandLineParser().parser.parse_args(
+        ["-p", str(path), "-o", str(path), "-b", "-cf", "2400", "-w", "1"] + CONFIGURATIONS[name])
+    generator = GenerateVideo(args)
+    groups = [generator._load_group(paths) for paths in generator._group_paths()]
+
+    # Warm up once, so lazily allocated buffers count as working memory of the first frame
+    rss_before = peak_rss_bytes()
+    generator._process_group(groups[0])
+
+    start = time.perf_counter()
+    for images in groups:
+        generator._process_group(images)
+    elapsed = time.perf_counter() - start
+    rss_after = peak_rss_bytes()
+
+    return {
+        "configuration": name,
+        "frames": len(groups),
+        "fps": len(groups) / elapsed,
+        "ms_per_frame": 1000.0 * elapsed / len(groups),
+        "memory_per_frame_mb": (rss_after - rss_before) / 2 ** 20 if rss_before is not None else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=24, help="Number of synthetic frame triplets - default is 24")
+    parser.add_argument("--width", type=int, default=1920, help="Frame width - default is 1920")
+    parser.add_argument("--height", type=int, default=1080, help="Frame height - default is 1080")
+    parser.add_argument("--configurations", nargs="+", choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument("--json", type=pathlib.Path, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--run", nargs=2, metavar=("PATH", "CONFIGURATION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_configuration(pathlib.Path(args.run[0]), args.run[1])))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="beck-view-hdr-") as directory:
+        path = pathlib.Path(directory)
+        write_frame_set(path, args.frames, args.width, args.height)
+
+        def run(name: str) -> dict:
+            output = subprocess.run([sys.executable, __file__, "--run", str(path), name],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True)
+            return json.loads(output.stdout.strip().splitlines()[-1])
+
+        # Calibrate the camera response curve up front, so no measured run includes the calibration
+        run("debevec")
+        results = [run(name) for name in args.configurations]
+
+    print(f"{'configuration':<14}{'fps':>8}{'ms/frame':>10}{'MB/frame':>10}")
+    for result in results:
+        memory = f"{result['memory_per_frame_mb']:.0f}" if result["memory_per_frame_mb"] is not None else "-"
+        print(f"{result['configuration']:<14}{result['fps']:>8.2f}{result['ms_per_frame']:>10.1f}{memory:>10}")
+
+    if args.json is not None:
+        args.json.write_text(json.dumps({"environment": environment(), "width": args.width, "height": args.height,
+                                          "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
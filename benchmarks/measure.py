@@ -0,0 +1,43 @@
+"""Measurement helpers shared by the benchmarks."""
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+from typing import Any, Dict
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def peak_rss_bytes() -> int | None:
+    """Peak resident set size of this process so far, None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def environment() -> Dict[str, Any]:
+    import cv2
+    import numpy as np
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
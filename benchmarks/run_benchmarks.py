@@ -0,0 +1,303 @@
+"""Benchmark suite of beck-view-movie on synthetic frame sets.
+
+Generates frameNNNNNa/b/c.png directories at several sizes and lengths in a temporary directory,
+then measures every stage of the assembly on its own - indexing, decode, merge, countTonemap,
+tone map, encode - and the whole GenerateVideo run end to end. Every stage runs in a fresh
+process and reports frames per second, time and peak resident set size. Results are written as
+JSON, so runs of different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --sizes 1920x1080 --frames 24 --output before.json
+    python benchmarks/run_benchmarks.py --sizes 1920x1080 --frames 24 --compare before.json
+
+The encode stage pipes the frames through x264 into ffmpeg's null muxer; it and the end to end
+run are skipped if ffmpeg is not on the PATH.
+
+Every run also measures the startup time of the command line (--help, --version) and fails with
+--check-startup if it imports one of the heavy modules OpenCV, NumPy or tqdm:
+
+    python benchmarks/run_benchmarks.py --startup-only --check-startup
+"""
+import argparse
+import json
+import pathlib
+import shlex
+import shutil
+import subprocess
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from measure import ROOT, environment, peak_rss_bytes
+from synthetic import write_frame_set
+
+sys.path.insert(0, str(ROOT))
+
+STAGES = ["index", "decode", "merge", "count_tonemap", "tone_map", "encode", "end_to_end"]
+ENCODER_STAGES = {"encode", "end_to_end"}
+# Quick commands must not import these - they take most of the startup time, seconds in the frozen executable
+HEAVY_MODULES = ("cv2", "numpy", "tqdm")
+STARTUP_COMMANDS = (["--help"], ["--version"])
+
+
+def count_tonemap_reference(hdr: np.ndarray, min_fraction: float = 0.0005) -> np.ndarray:
+    """The loop over the histogram bins GenerateVideo.countTonemap replaced, kept to check its result."""
+    import cv2
+
+    counts, ranges = np.histogram(hdr, 256)
+    min_count = min_fraction * hdr.size
+    delta_range = ranges[1] - ranges[0]
+
+    image = hdr.copy()
+    for i in range(len(counts)):
+        if counts[i] < min_count:
+            image[image >= ranges[i + 1]] -= delta_range
+        ranges -= delta_range
+
+    return cv2.normalize(image, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
+
+
+def _generator(path: pathlib.Path, output: pathlib.Path, options: List[str], encode: bool = False):
+    from CommandLineParser import CommandLineParser
+    from createVideo import GenerateVideo
+
+    # Encoded in one piece without checkpoints, so the run does not include joining the parts
+    checkpoints = ["-cf", "0"] if encode else ["-cf", "2400"]
+    args = CommandLineParser().parser.parse_args(["-p", str(path), "-o", str(output), "-b"] + checkpoints + options)
+    return GenerateVideo(args)
+
+
+def _timed(function: Callable[[], Any]) -> tuple:
+    rss_before = peak_rss_bytes()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    rss_after = peak_rss_bytes()
+    return result, seconds, rss_before, rss_after
+
+
+def run_stage(path: pathlib.Path, stage: str, options: List[str]) -> Dict[str, Any]:
+    """Measures one stage; its inputs are prepared first and are not part of the measurement."""
+    from frameIndex import FrameIndex
+
+    output = path.parent / "output"
+    output.mkdir(exist_ok=True)
+    details: Dict[str, Any] = {}
+
+    if stage == "index":
+        _, seconds, rss_before, rss_after = _timed(lambda: FrameIndex.scan(path, True))
+        frames = len(FrameIndex.scan(path, True).frames)
+        _, details["manifest_load_s"], _, _ = _timed(lambda: FrameIndex.load(path, True))
+
+    elif stage == "end_to_end":
+        def assemble():
+            generator = _generator(path, output, options, encode=True)
+            generator.assemble_video()
+            return generator.frames_written
+
+        frames, seconds, rss_before, rss_after = _timed(assemble)
+
+    else:
+        generator = _generator(path, output, options)
+        groups = generator._group_paths()
+        frames = len(groups)
+        if generator.merge_mertens is not None and stage in ("count_tonemap", "tone_map"):
+            return {"stage": stage, "skipped": "not used by exposure fusion"}
+
+        if stage == "decode":
+            _, seconds, rss_before, rss_after = _timed(lambda: [generator._load_group(paths) for paths in groups])
+        else:
+            decoded = [generator._load_group(paths) for paths in groups]
+            if stage == "merge":
+                merge = generator._merged_hdr if generator.merge_mertens is None else generator._fused_frame
+                # _merged_hdr includes countTonemap; time the merge alone
+                generator.countTonemap = lambda hdr, min_fraction=0.0: hdr
+                _, seconds, rss_before, rss_after = _timed(lambda: [merge(images) for images in decoded])
+            elif stage == "count_tonemap":
+                count_tonemap = generator.countTonemap
+                generator.countTonemap = lambda hdr, min_fraction=0.0: hdr
+                merged = [generator._merged_hdr(images) for images in decoded]
+                _, seconds, rss_before, rss_after = _timed(lambda: [count_tonemap(hdr) for hdr in merged])
+                details.update(_compare_count_tonemap(count_tonemap, merged[0]))
+            elif stage == "tone_map":
+                normalized = [generator._merged_hdr(images) for images in decoded]
+                _, seconds, rss_before, rss_after = _timed(
+                    lambda: [generator._ldr_frame(generator.tone_map.process(hdr)) for hdr in normalized])
+            elif stage == "encode":
+                processed = [generator._process_group(images) for images in decoded]
+                _, seconds, rss_before, rss_after = _timed(lambda: _encode_to_null(generator, processed))
+            else:
+                raise ValueError(f"Unknown stage: {stage}")
+
+    return {
+        "stage": stage,
+        "frames": frames,
+        "seconds": round(seconds, 4),
+        "fps": round(frames / seconds, 3) if seconds > 0 else None,
+        "peak_rss_mb": round(rss_after / 2 ** 20, 1) if rss_after is not None else None,
+        "rss_growth_mb": round((rss_after - rss_before) / 2 ** 20, 1) if rss_after is not None else None,
+        **details,
+    }
+
+
+def _compare_count_tonemap(count_tonemap: Callable, hdr: np.ndarray) -> Dict[str, Any]:
+    result = count_tonemap(hdr)
+    start = time.perf_counter()
+    reference = count_tonemap_reference(hdr)
+    reference_seconds = time.perf_counter() - start
+    difference = np.abs(result - reference)
+    return {
+        "reference_s_per_frame": round(reference_seconds, 4),
+        "reference_max_abs_diff": float(difference.max()),
+        # Pixels exactly on a bin edge may land in the neighbouring bin of the reference loop
+        "reference_mismatch_ppm": round(1e6 * np.count_nonzero(difference > 1e-3) / difference.size, 2),
+    }
+
+
+def _encode_to_null(generator, frames: List[np.ndarray]) -> None:
+    cmd = generator._encoder_command("-")
+    # x264 still encodes every frame, the null muxer discards the result
+    i = cmd.index("-movflags")
+    cmd = cmd[:i] + cmd[i + 2:-1] + ["-f", "null", "-"]
+    with generator._start_encoder(cmd) as encoder:
+        for frame in frames:
+            generator._write_frame(encoder, frame)
+
+
+def measure_startup(runs: int = 5) -> Dict[str, Any]:
+    """Wall time of quick commands of main.py and the heavy modules they import."""
+    main = str(ROOT / "main.py")
+    results: Dict[str, Any] = {}
+    for command in STARTUP_COMMANDS:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, main] + command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+
+        trace = subprocess.run([sys.executable, "-X", "importtime", main] + command,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+        imported = {line.rsplit("|", 1)[-1].strip() for line in trace.splitlines() if line.startswith("import time:")}
+        results[" ".join(command)] = {
+            "median_ms": round(1000 * statistics.median(times), 1),
+            "heavy_imports": [module for module in HEAVY_MODULES if module in imported],
+        }
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results["interpreter_ms"] = round(1000 * (time.perf_counter() - start), 1)
+    return results
+
+
+def _print_startup(startup: Dict[str, Any]) -> None:
+    print(f"\nStartup (the interpreter alone takes {startup['interpreter_ms']:.0f} ms)")
+    for command in STARTUP_COMMANDS:
+        result = startup[" ".join(command)]
+        heavy = ", ".join(result["heavy_imports"]) or "none"
+        print(f"  main.py {' '.join(command):<12}{result['median_ms']:>8.0f} ms   heavy imports: {heavy}")
+
+
+def _run_in_process(path: pathlib.Path, stage: str, options: List[str]) -> Dict[str, Any]:
+    result = subprocess.run([sys.executable, __file__, "--run-stage", str(path), stage, "--options", shlex.join(options)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        return {"stage": stage, "error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _compare(results: List[Dict[str, Any]], startup: Dict[str, Any], baseline_file: pathlib.Path) -> None:
+    baseline = json.loads(baseline_file.read_text(encoding="utf-8"))
+    before = {(r["size"], r["frames"], s["stage"]): s for r in baseline["runs"] for s in r["stages"]}
+    print(f"\nCompared to {baseline_file} (commit {baseline['environment'].get('commit')})")
+    for command in STARTUP_COMMANDS:
+        key = " ".join(command)
+        if key in baseline.get("startup", {}):
+            print(f"main.py {key:<12} {baseline['startup'][key]['median_ms']:.0f} ms before, "
+                  f"{startup[key]['median_ms']:.0f} ms now")
+    print(f"{'size':<11}{'frames':>7}  {'stage':<15}{'fps before':>11}{'fps now':>10}{'speed-up':>10}")
+    for run in results:
+        for stage in run["stages"]:
+            old = before.get((run["size"], run["frames"], stage["stage"]))
+            if old is None or not old.get("fps") or not stage.get("fps"):
+                continue
+            print(f"{run['size']:<11}{run['frames']:>7}  {stage['stage']:<15}{old['fps']:>11.2f}{stage['fps']:>10.2f}"
+                  f"{stage['fps'] / old['fps']:>9.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["960x540", "1920x1080"],
+                        help="Frame sizes WIDTHxHEIGHT - default is 960x540 1920x1080")
+    parser.add_argument("--frames", nargs="+", type=int, default=[12, 48],
+                        help="Numbers of frame triplets - default is 12 48")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--options", type=str, default="",
+                        help='Options of beck-view-movie for every run, e.g. "--merge-engine lut"')
+    parser.add_argument("--output", type=pathlib.Path, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=pathlib.Path, default=None, help="Compare to the results in this JSON file")
+    parser.add_argument("--startup-only", action="store_true", help="Only measure the startup of the command line")
+    parser.add_argument("--check-startup", action="store_true",
+                        help="Exit with an error if a quick command imports " + ", ".join(HEAVY_MODULES))
+    parser.add_argument("--run-stage", nargs=2, metavar=("PATH", "STAGE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    options = shlex.split(args.options)
+
+    if args.run_stage:
+        print(json.dumps(run_stage(pathlib.Path(args.run_stage[0]), args.run_stage[1], options)))
+        return
+
+    startup = measure_startup()
+    _print_startup(startup)
+    heavy = sorted({module for command in STARTUP_COMMANDS for module in startup[" ".join(command)]["heavy_imports"]})
+    if args.startup_only:
+        if args.check_startup and heavy:
+            sys.exit(f"Quick commands import {', '.join(heavy)}")
+        return
+
+    stages = args.stages
+    if shutil.which("ffmpeg") is None and ENCODER_STAGES & set(stages):
+        print("ffmpeg not found - skipping the encode and end to end stages")
+        stages = [stage for stage in stages if stage not in ENCODER_STAGES]
+
+    runs = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        for frames in args.frames:
+            with tempfile.TemporaryDirectory(prefix="beck-view-benchmark-") as directory:
+                path = pathlib.Path(directory) / "frames"
+                path.mkdir()
+                write_frame_set(path, frames, width, height)
+                # Write manifest and camera response curve up front, so no stage includes the calibration
+                subprocess.run([sys.executable, __file__, "--run-stage", str(path), "decode", "--options",
+                                shlex.join(options)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                results = [_run_in_process(path, stage, options) for stage in stages]
+            runs.append({"size": size, "frames": frames, "options": args.options, "stages": results})
+
+            print(f"\n{size}, {frames} frames")
+            print(f"  {'stage':<15}{'fps':>9}{'seconds':>10}{'peak MB':>9}{'growth MB':>11}")
+            for r in results:
+                if "error" in r or "skipped" in r:
+                    print(f"  {r['stage']:<15} {'failed: ' + r['error'] if 'error' in r else 'skipped - ' + r['skipped']}")
+                    continue
+                peak = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+                growth = f"{r['rss_growth_mb']:.0f}" if r["rss_growth_mb"] is not None else "-"
+                print(f"  {r['stage']:<15}{r['fps']:>9.2f}{r['seconds']:>10.2f}{peak:>9}{growth:>11}")
+                if "reference_max_abs_diff" in r:
+                    print(f"  {'':<15}countTonemap vs. reference loop: max difference {r['reference_max_abs_diff']:.3g}, "
+                          f"{r['reference_mismatch_ppm']} ppm of pixels differ, loop {r['reference_s_per_frame']:.3f} s/frame")
+
+    report = {"environment": environment(), "startup": startup, "runs": runs}
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.output}")
+    if args.compare is not None:
+        _compare(runs, startup, args.compare)
+    if args.check_startup and heavy:
+        sys.exit(f"Quick commands import {', '.join(heavy)}")
+
+
+if __name__ == "__main__":
+    main()
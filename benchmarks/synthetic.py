@@ -0,0 +1,27 @@
+"""Synthetic frame sets in the layout written by beck-view-digitalize."""
+import pathlib
+
+import cv2
+import numpy as np
+
+# Relative exposure of frameNNNNNa/b/c.png for the exposure times 128, 256 and 64 in GenerateVideo
+EXPOSURES = (("a", 0.5), ("b", 1.0), ("c", 0.25))
+
+
+def write_frame_set(path: pathlib.Path, count: int, width: int, height: int, bracketing: bool = True,
+                    seed: int = 0) -> None:
+    """Writes ``count`` frames of a slowly panning, grainy scene with a wide dynamic range.
+
+    The same seed always gives the same files, so results of different commits are comparable.
+    """
+    rng = np.random.default_rng(seed)
+    scene = cv2.GaussianBlur(rng.random((height, width, 3), dtype=np.float32), (0, 0), 12)
+    scene = cv2.normalize(scene, None, 0.0, 1.0, cv2.NORM_MINMAX)
+    scene = scene ** 2 * np.linspace(0.2, 3.0, width, dtype=np.float32)[None, :, None]
+
+    exposures = EXPOSURES if bracketing else EXPOSURES[:1]
+    for frame in range(count):
+        radiance = np.roll(scene, 4 * frame, axis=1) + rng.normal(0.0, 0.01, scene.shape).astype(np.float32)
+        for exposure, factor in exposures:
+            image = np.clip(radiance * factor * 255.0, 0, 255).astype(np.uint8)
+            cv2.imwrite(str(path / f"frame{frame:05d}{exposure}.png"), image)
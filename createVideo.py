@@ -1,36 +1,283 @@
+import atexit
+import functools
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
 import pathlib
+import re
 import subprocess
 import sys
 import threading
+import time
+import tracemalloc
 from argparse import Namespace
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from multiprocessing import shared_memory
 from random import randint
-from typing import List
+from typing import Callable, Deque, Iterable, Iterator, List, NamedTuple, Tuple
 
 import cv2
 import numpy as np
 from numpy import ndarray
 from tqdm import tqdm
 
-from getSortedFilenames import get_sorted_image_files
+from CommandLineParser import CommandLineParser
+from duplicateFrames import DuplicateDetector
+from encodeJournal import EncodeJournal
+from encoderFanOut import EncoderFanOut
+from filmGate import Gate, detect_gate
+from frameCache import FrameCache, FrameCacheWriter
+from frameIndex import FrameIndex
+from framePipeline import FramePipeline
+from frameStream import DirectorySource, FfmpegSink, FrameSink, FrameSource, Image, WatchSource, image_name, image_size
+from readAhead import ImageBytes, ReadAhead
+from resourceTuner import (ENCODER_FRAMES, WORKER_PROCESS_BYTES, FrameCost, PipelineTuner, available_memory_bytes,
+                           cpu_list, current_rss_bytes, plan_pipeline, split_cpus, thread_affinity, usable_cpus)
+from stageMetrics import Record, StageMetrics, ThreadProfiler
 from tqdm_logger import TqdmLogger
 
 
+X264_PRESETS = {
+    "preview": {
+        "crf": "26",
+        "preset": "ultrafast",
+        "x264_params": (
+            "aq-mode=1:"
+            "psy-rd=1.0"
+        ),
+    },
+    "good": {
+        "crf": "20",
+        "preset": "medium",
+        "x264_params": None,
+    },
+    "better": {
+        "crf": "18",
+        "preset": "slow",
+        "x264_params": (
+            "aq-mode=0:"
+            "psy-rd=0.5:"
+            "deblock=0,0"
+        ),
+    },
+    "best": {
+        "crf": "10",
+        "preset": "veryslow",
+        "x264_params": (
+            "aq-mode=0:"
+            "psy-rd=0:"
+            "bframes=0:"
+            "deblock=0,0"
+        ),
+    },
+}
+
+TONE_MAPPER_PRESETS = ("default", "cinematic", "natural", "highlight", "soft", "vivid", "neutral")
+
+# Tone mapper parameters that can be set on the command line on top of a preset
+TONE_MAPPER_PARAMETERS = ("drago_bias", "reinhard_gamma", "reinhard_intensity", "reinhard_light_adapt",
+                          "reinhard_color_adapt", "mantiuk_scale", "mantiuk_saturation", "mantiuk_bias")
+
+
+class Rendition(NamedTuple):
+    """One encoded output of the processed frames."""
+    name: str
+    quality: str
+    output_format: str
+    # Width and height ffmpeg scales the frames to - None keeps the frame size
+    size: Tuple[int, int] | None = None
+
+
+class LutMergeDebevec:
+    """Debevec merge of 8-bit exposures through 256-entry lookup tables.
+
+    Gives the same result as cv2.MergeDebevec for a fixed response curve and fixed exposure times,
+    but merges the exposures of a frame (H x W x 3 uint8 each) using precomputed weight and
+    log-response tables. Output and scratch buffers are kept per thread and reused, so the
+    returned array is only valid until the next call from the same thread.
+    """
+
+    def __init__(self, times: ndarray[np.float32], response: ndarray[np.float32]) -> None:
+        channels = 3
+        levels = np.arange(256, dtype=np.float32)
+        # Same hat weights as OpenCV's MergeDebevec, pre-divided by the number of channels,
+        # so summing the looked up channel weights gives the per pixel weight directly
+        weights = np.minimum(levels, 255.0 - levels) / channels
+        self.weight_lut: ndarray[np.float32] = np.repeat(weights[:, None], channels, axis=1).reshape(256, 1, channels)
+        self.channel_sum: ndarray[np.float32] = np.ones((1, channels), dtype=np.float32)
+
+        # One table per exposure: log response minus log exposure time
+        log_response = np.log(response.reshape(256, channels).astype(np.float32))
+        self.log_luts: List[ndarray[np.float32]] = [
+            (log_response - np.log(np.float32(t))).reshape(256, 1, channels).astype(np.float32) for t in times
+        ]
+        self._local = threading.local()
+
+    def _buffers(self, shape: tuple) -> tuple:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].shape != shape:
+            buffers = (np.empty(shape, dtype=np.float32),
+                       np.empty(shape, dtype=np.float32),
+                       np.empty(shape[:-1], dtype=np.float32),
+                       np.empty(shape[:-1], dtype=np.float32))
+            self._local.buffers = buffers
+        return buffers
+
+    def process(self, images: List[ndarray[np.uint8]]) -> ndarray[np.float32]:
+        height, width, channels = images[0].shape
+        merged, values, weight, weight_sum = self._buffers((height, width, channels))
+        merged.fill(0.0)
+        weight_sum.fill(0.0)
+
+        # The exposures are looked up where they are - cropped views need no copy
+        for image, log_lut in zip(images, self.log_luts):
+            cv2.LUT(image, self.weight_lut, dst=values)
+            cv2.transform(values, self.channel_sum, dst=weight)
+            weight_sum += weight
+            cv2.LUT(image, log_lut, dst=values)
+            values *= weight[..., None]
+            merged += values
+
+        # Pixels that are black or saturated in every exposure have no weight at all;
+        # like OpenCV, fall back to the unweighted mean over the exposures for them.
+        unweighted = weight_sum == 0
+        if unweighted.any():
+            weight_sum[unweighted] = 1.0
+            merged[unweighted] = 0.0
+            for image, log_lut in zip(images, self.log_luts):
+                merged[unweighted] += log_lut[image[unweighted], 0, np.arange(channels)] / len(images)
+
+        np.reciprocal(weight_sum, out=weight_sum)
+        merged *= weight_sum[..., None]
+        np.exp(merged, out=merged)
+
+        return merged
+
+
+class ReducedMergeMertens:
+    """Mertens exposure fusion with the weight maps computed at reduced resolution.
+
+    Follows cv2.MergeMertens - contrast, saturation and well-exposedness weights, blended through
+    Laplacian pyramids - but computes the weights on pyramid level ``log2(scale)`` of every
+    exposure instead of the full-size image. The finer weight levels are interpolated with pyrUp.
+    """
+
+    def __init__(self, scale: int = 2, contrast_weight: float = 1.0, saturation_weight: float = 1.0,
+                 exposure_weight: float = 0.0) -> None:
+        self.skip_levels = max(0, int(round(np.log2(scale))))
+        self.contrast_weight = contrast_weight
+        self.saturation_weight = saturation_weight
+        self.exposure_weight = exposure_weight
+
+    def _weight(self, image: ndarray[np.float32]) -> ndarray[np.float32]:
+        # Same weights as OpenCV's MergeMertens, which also converts BGR frames with COLOR_RGB2GRAY
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        contrast = np.abs(cv2.Laplacian(gray, cv2.CV_32F))
+
+        mean = cv2.transform(image, np.full((1, 3), 1.0 / 3.0, dtype=np.float32))
+        deviation = image - mean[..., None]
+        saturation = np.sqrt(cv2.transform(deviation * deviation, np.ones((1, 3), dtype=np.float32)))
+
+        weight = np.power(contrast, self.contrast_weight) * np.power(saturation, self.saturation_weight)
+        if self.exposure_weight != 0.0:
+            well_exposed = np.exp(-np.sum((image - 0.5) ** 2, axis=2) / (2 * 0.2 ** 2))
+            weight *= np.power(well_exposed, self.exposure_weight)
+        return weight + np.float32(1e-12)
+
+    def process(self, images: List[ndarray[np.uint8]]) -> ndarray[np.float32]:
+        height, width = images[0].shape[:2]
+        max_level = int(np.log(min(height, width)) / np.log(2))
+        skip = min(self.skip_levels, max_level)
+
+        pyramids = []
+        weights = []
+        for image in images:
+            pyramid = [np.multiply(image, np.float32(1.0 / 255.0), dtype=np.float32)]
+            for _ in range(max_level):
+                pyramid.append(cv2.pyrDown(pyramid[-1]))
+            weights.append(self._weight(pyramid[skip]))
+            pyramids.append(pyramid)
+        weight_sum = sum(weights)
+
+        result: List[ndarray[np.float32]] = []
+        for pyramid, weight in zip(pyramids, weights):
+            weight /= weight_sum
+            weight_pyramid: List[ndarray[np.float32] | None] = [None] * (max_level + 1)
+            weight_pyramid[skip] = weight
+            for level in range(skip, max_level):
+                weight_pyramid[level + 1] = cv2.pyrDown(weight_pyramid[level])
+            for level in range(skip, 0, -1):
+                weight_pyramid[level - 1] = cv2.pyrUp(weight_pyramid[level], dstsize=pyramid[level - 1].shape[1::-1])
+
+            for level in range(max_level + 1):
+                band = pyramid[level]
+                if level < max_level:
+                    cv2.subtract(band, cv2.pyrUp(pyramid[level + 1], dstsize=band.shape[1::-1]), dst=band)
+                level_weight = weight_pyramid[level]
+                cv2.multiply(band, cv2.merge((level_weight, level_weight, level_weight)), dst=band)
+                if len(result) <= level:
+                    result.append(band)
+                else:
+                    cv2.add(result[level], band, dst=result[level])
+
+        for level in range(max_level, 0, -1):
+            cv2.add(result[level - 1], cv2.pyrUp(result[level], dstsize=result[level - 1].shape[1::-1]),
+                    dst=result[level - 1])
+
+        return result[0]
+
+
+def _on_hdr_cpus(method: Callable) -> Callable:
+    """Runs ``method`` with the calling thread pinned to the HDR CPUs of the reel (--cpu-split).
+
+    The loaders, workers and worker processes it starts inherit the mask; encoders are started on the
+    encoder CPUs. The mask of the thread is restored afterwards, so other reels of a batch keep all CPUs.
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        with thread_affinity(self.hdr_cpus):
+            return method(self, *args, **kwargs)
+
+    return run
+
+
 class GenerateVideo:
+    """Assembles the frames of one reel into a video.
 
-    def __init__(self, args: Namespace) -> None:
+    The frames come from ``source`` - by default the directory of ``args.path``, or the frames
+    arriving in it with ``args.follow``. ``assemble_video`` encodes them with ffmpeg as configured
+    by ``args``; ``iter_frames`` and ``write_frames`` hand the processed frames to other code.
+    """
+
+    def __init__(self, args: Namespace, source: FrameSource | None = None) -> None:
         self.calibrate_debevec: cv2.CalibrateDebevec
         self.merge_debevec: cv2.MergeDebevec
         self.tone_map = cv2.TonemapDrago
+        self.source = source
 
         self._initialize_args(args)
         self._initialize_logging()
         self._initialize_resolution()
+        self._initialize_gate()
         if self.bracketing: self._initialize_bracketing()
+        self._initialize_resources()
         self._initialize_video_writer()
 
+    @classmethod
+    def from_options(cls, source: FrameSource | None = None, **options) -> "GenerateVideo":
+        """Creates a generator with the defaults of the command line, changed by ``options``, e.g. bracketing=True."""
+        args = CommandLineParser().parser.parse_args([])
+        for name, value in options.items():
+            if not hasattr(args, name):
+                raise TypeError(f"Unknown option: {name}")
+            setattr(args, name, value)
+        return cls(args, source)
+
     def _initialize_args(self, args: Namespace) -> None:
         self.path: pathlib.Path = args.path
         self.opath: pathlib.Path = args.opath
@@ -38,30 +285,47 @@ class GenerateVideo:
         self.output_format: str = args.output_format
         self.fps: float = args.fps
         self.quality: str = args.quality
-        self.batch_size: int = min(max(1, args.batch_size), 498)
+        # "auto" sizes workers and images in flight from the CPUs, the memory and a short warm-up measurement
+        self.auto_workers: bool = str(args.num_workers).lower() == "auto"
+        self.auto_batch_size: bool = str(args.batch_size).lower() == "auto"
+        self.memory_limit: float | None = getattr(args, "memory_limit", None)
+        # Set by the batch scheduler: the number of reels sharing the available memory
+        self.memory_share: int = max(1, getattr(args, "memory_share", 1))
+        self.batch_size: int = 100 if self.auto_batch_size else min(max(1, args.batch_size), 498)
         self.bracketing: bool = args.bracketing
+        self.merge_engine: str = getattr(args, "merge_engine", "opencv")
+        self.hdr_mode: str = getattr(args, "hdr_mode", "debevec")
+        self.fusion_scale: int = max(1, getattr(args, "fusion_scale", 2))
         self.tone_mapper_preset = getattr(args, "tone_mapper_preset", "default").lower()
-        self.tone_mapper: str = getattr(args, "tone_mapper", "drago").lower()
-
-        self.left_crop = 230
-        self.right_crop = 230
+        self.requested_tone_mapper: str = getattr(args, "tone_mapper", "drago").lower()
+        self.tone_mapper_overrides = {name: getattr(args, name) for name in TONE_MAPPER_PARAMETERS
+                                      if getattr(args, name, None) is not None}
+
+        # Proxy renders decode frames at 1/proxy of their size and may only take every proxy_step-th frame
+        self.proxy: int = getattr(args, "proxy", 1)
+        self.proxy_step: int = max(1, getattr(args, "proxy_step", 1))
+        self.imread_flags: int = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}.get(self.proxy,
+                                                                                                    cv2.IMREAD_COLOR)
+        if self.proxy > 1 or self.proxy_step > 1:
+            self.name += "-proxy"
+
+        self.left_crop = 230 // self.proxy
+        self.right_crop = 230 // self.proxy
+        self.top_crop = 0
+        self.bottom_crop = 0
+
+        # "fixed" crops the columns above from bracketed frames, "auto" detects the film gate in the frames.
+        # The cropped frame is padded back by reflection or with black, or encoded at its cropped size.
+        self.gate: str = getattr(args, "gate", "fixed")
+        self.gate_output: str = getattr(args, "gate_output", "reflect")
+        self.crop_frames: bool = self.bracketing or self.gate == "auto"
 
         if self.bracketing:
             self.batch_size = min(max(3, self.batch_size - (self.batch_size % 3)), 498)
 
         self._apply_tone_mapper_preset()
 
-        # Allow overrides
-        self.drago_bias = getattr(args, "drago_bias", self.drago_bias)
-        self.reinhard_gamma = getattr(args, "reinhard_gamma", self.reinhard_gamma)
-        self.reinhard_intensity = getattr(args, "reinhard_intensity", self.reinhard_intensity)
-        self.reinhard_light_adapt = getattr(args, "reinhard_light_adapt", self.reinhard_light_adapt)
-        self.reinhard_color_adapt = getattr(args, "reinhard_color_adapt", self.reinhard_color_adapt)
-        self.mantiuk_scale = getattr(args, "mantiuk_scale", self.mantiuk_scale)
-        self.mantiuk_saturation = getattr(args, "mantiuk_saturation", self.mantiuk_saturation)
-        self.mantiuk_bias = getattr(args, "mantiuk_bias", self.mantiuk_bias)
-
-        self.num_workers: int = args.num_workers
+        self.num_workers: int = usable_cpus() if self.auto_workers else args.num_workers
         self.width_height = args.width_height
 
         self.flip: int = 2  # no flip
@@ -77,7 +341,96 @@ class GenerateVideo:
 
         self.gui = args.gui
 
+        # Set by the batch scheduler: the name of the job and the CPU budget shared by all reels
+        self.job_name: str | None = getattr(args, "job_name", None)
+        self.cpu_slots: threading.Semaphore | None = getattr(args, "cpu_slots", None)
+        self.frames_written = 0
+
+        # Instrumentation - periodic metrics log lines, Prometheus textfile, Chrome trace and cProfile statistics
+        self.metrics_interval: float = getattr(args, "metrics_interval", 0.0)
+        self.metrics_file: pathlib.Path | None = self._job_file(getattr(args, "metrics_file", None))
+        self.trace_file: pathlib.Path | None = self._job_file(getattr(args, "trace", None))
+        self.profile_file: pathlib.Path | None = self._job_file(getattr(args, "profile", None))
+
+        self.calibration: str = getattr(args, "calibration", "reel")
+        self.calibration_samples: int = max(1, getattr(args, "calibration_samples", 8))
+        self.recalibrate: bool = getattr(args, "recalibrate", False)
+
+        self.executor: str = getattr(args, "executor", "thread")
+        # Share of the CPUs for the HDR stage, "auto" to measure it - the rest runs the encoders; None shares all CPUs
+        self.cpu_split: float | str | None = getattr(args, "cpu_split", None)
+        self.hdr_cpus: List[int] | None = None
+        self.encoder_cpus: List[int] | None = None
+        self.x264_threads: int | None = None
+        # Image files read ahead of decoding by read_threads I/O threads - 0 reads them in the decoding threads
+        self.read_ahead: int = max(0, getattr(args, "read_ahead", 0))
+        self.read_threads: int = max(1, getattr(args, "read_threads", 4))
+        self.pipe_format: str = getattr(args, "pipe_format", "bgr24")
+        self.segments: int = max(1, getattr(args, "segments", 1))
+        self.checkpoint_frames: int = max(0, getattr(args, "checkpoint_frames", 0))
+        self.resume: bool = getattr(args, "resume", False)
+
+        self.frame_cache: FrameCache | None = None
+        self.frame_cache_dir: pathlib.Path | None = getattr(args, "frame_cache", None)
+        self.frame_cache_size: float = getattr(args, "frame_cache_size", 20.0)
+
+        # Frame groups that look like the frame before them reuse its processed frame
+        self.duplicate_tolerance: float = max(0.0, getattr(args, "duplicate_tolerance", 0.0))
+        # index, file name and file name of the frame shown instead of every duplicate
+        self.duplicates: List[Tuple[int, str, str]] = []
+
+        self.follow: bool = getattr(args, "follow", False)
+        self.follow_sentinel: str = getattr(args, "follow_sentinel", "beck-view-digitalize.done")
+        self.follow_timeout: float = getattr(args, "follow_timeout", 60.0)
+
+        # None - no sweep, [] - sweep all presets
+        self.sweep_presets: List[str] | None = getattr(args, "sweep", None)
+        self.sweep_frames: int = max(1, getattr(args, "sweep_frames", 12))
+        self.sweep_range: Tuple[int | None, int | None] | None = None
+        if getattr(args, "sweep_range", None):
+            start, end = args.sweep_range.split(":")
+            self.sweep_range = (int(start) if start else None, int(end) if end else None)
+        if self.sweep_presets is not None:
+            # A sweep compares tone mappers on frames that are already digitized
+            self.follow = False
+
+        # The first rendition is the video named by --name, --quality and --output-format
+        self.renditions: List[Rendition] = [Rendition(self.name, self.quality, self.output_format)]
+        for spec in getattr(args, "renditions", None) or []:
+            rendition = self._parse_rendition(spec)
+            if rendition not in self.renditions:
+                self.renditions.append(rendition)
+
+    def _job_file(self, path: pathlib.Path | None) -> pathlib.Path | None:
+        # Reels of a batch run side by side - every reel writes its own file
+        if path is None or self.job_name is None:
+            return path
+        return path.with_name(f"{path.stem}-{self.job_name}{path.suffix}")
+
+    def _parse_rendition(self, spec: str) -> Rendition:
+        # QUALITY[:FORMAT][:WIDTHxHEIGHT], e.g. "preview:mp4:960x540"
+        quality, *options = spec.lower().split(":")
+        if quality not in X264_PRESETS:
+            raise ValueError(f"Unknown quality '{quality}' in rendition '{spec}'")
+
+        output_format = self.output_format
+        size: Tuple[int, int] | None = None
+        for option in options:
+            if option in ("mp4", "mov"):
+                output_format = option
+            elif re.fullmatch(r"\d+x\d+", option):
+                width, height = (int(v) for v in option.split("x"))
+                if width < 2 or height < 2 or width % 2 or height % 2:
+                    raise ValueError(f"Rendition '{spec}' needs an even width and height for yuv420p")
+                size = (width, height)
+            else:
+                raise ValueError(f"Unknown option '{option}' in rendition '{spec}'")
+
+        name = f"{self.name}-{quality}" + (f"-{size[0]}x{size[1]}" if size is not None else "")
+        return Rendition(name, quality, output_format, size)
+
     def _apply_tone_mapper_preset(self) -> None:
+        self.tone_mapper = self.requested_tone_mapper
         self.drago_bias = 2.2
         self.reinhard_gamma = 1.0
         self.reinhard_intensity = 0.0
@@ -121,15 +474,33 @@ class GenerateVideo:
             self.tone_mapper = "drago"
             self.drago_bias = 2.0
 
+        # Parameters given on the command line take precedence over the preset
+        for name, value in self.tone_mapper_overrides.items():
+            setattr(self, name, value)
+
     def _initialize_logging(self) -> None:
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        self.logger = logging.getLogger(__name__)
+        self.logger = logging.getLogger(__name__ if self.job_name is None else f"{__name__}.{self.job_name}")
         if self.gui:
             handler = logging.StreamHandler(sys.stdout)
             self.logger.addHandler(handler)
 
+        self.metrics = StageMetrics(self.logger, self.metrics_interval, self.metrics_file, self.trace_file,
+                                    reel=self.job_name or self.name)
+        self.profiler: ThreadProfiler | None = ThreadProfiler() if self.profile_file is not None else None
+
+        if self.frame_cache_dir is not None:
+            self.frame_cache = FrameCache(self.frame_cache_dir, int(self.frame_cache_size * 2 ** 30), self.logger)
+
     def _initialize_resolution(self) -> None:
-        self.image_list: List[str] = get_sorted_image_files(self.bracketing, str(self.path))
+        if self.source is None:
+            # Frames still being digitized are followed, starting with the first complete frame groups
+            self.source = WatchSource(self.path, self.bracketing, self.follow_sentinel, self.follow_timeout) \
+                if self.follow else DirectorySource(self.path, self.bracketing)
+        self.follow = self.source.follows
+        with self.metrics.time("index") if not self.follow else nullcontext():
+            self.image_list: List[Image] = self.source.open(self.calibration_samples, self.logger)
+        self.frame_index: FrameIndex | None = self.source.frame_index
 
         self.width = 1920
         self.height = 1080
@@ -140,81 +511,398 @@ class GenerateVideo:
         else:
             if len(self.image_list) > 0:
                 index: int = randint(0, len(self.image_list) - 1)
-                test_image = cv2.imread(self.image_list[index])
-                (self.height, self.width, _) = test_image.shape
+                # The PNG header is enough to learn the size - only decode if it cannot be read
+                size = image_size(self.image_list[index])
+                if size is not None:
+                    (self.width, self.height) = size
+                else:
+                    test_image = cv2.imread(self.image_list[index])
+                    (self.height, self.width, _) = test_image.shape
             else:
                 self.logger.error(f"No images found in {str(self.path)}")
 
+        if self.proxy > 1:
+            # Reduced decoding of PNG files rounds the size down
+            self.width //= self.proxy
+            self.height //= self.proxy
+            self.logger.info(f"Proxy: decoding frames at 1/{self.proxy} size, using one of every {self.proxy_step} frames")
+        elif self.proxy_step > 1:
+            self.logger.info(f"Proxy: using one of every {self.proxy_step} frames")
+
         self.logger.info(
-            f"Creating video from {len(self.image_list)} 'frames*.png' files with resolution {self.width} x {self.height} in {str(self.opath / self.name)}.{self.output_format}.")
+            f"Creating video from {len(self.image_list)} {'frames*.png files' if self.source.files else 'images'} with resolution {self.width} x {self.height} in {str(self.opath / self.name)}.{self.output_format}.")
+
+    def _detect_gate(self) -> Gate | None:
+        if not self.source.files or not self.image_list:
+            return None
+        size = image_size(self.image_list[0])
+        if size is None:
+            return None
+
+        sampled = self._sampled_groups(self._group_paths())
+
+        # The gate is kept in a sidecar file next to the frames, valid while frame size and sampled files are unchanged
+        gate_file = self.path / "film_gate.json"
+        key = {"size": list(size), "files": self._file_stats(sampled)}
+        try:
+            data = json.loads(gate_file.read_text(encoding="utf-8"))
+            if data.get("size") == key["size"] and data.get("files") == key["files"]:
+                self.logger.info(f"Using the film gate from {str(gate_file)}")
+                return Gate(*data["gate"])
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+
+        with self.metrics.time("gate_detection"):
+            gate = detect_gate(sampled, size)
+
+        if gate is not None:
+            try:
+                gate_file.write_text(json.dumps({**key, "gate": list(gate)}), encoding="utf-8")
+                if self.frame_index is not None:
+                    self.frame_index.refresh()
+            except OSError as e:
+                self.logger.warning(f"Could not save film gate to {str(gate_file)} - {e}")
+        return gate
+
+    def _initialize_gate(self) -> None:
+        if self.gate == "auto":
+            gate = self._detect_gate()
+            if gate is not None:
+                # Detected in unflipped frames at full size
+                gate = gate.flipped(self.flip)
+                if self.proxy > 1:
+                    gate = gate.scaled(self.proxy)
+                self.left_crop, self.top_crop, self.right_crop, self.bottom_crop = gate[:4]
+            elif self.bracketing:
+                self.logger.warning(f"No film gate found - cropping {self.left_crop} columns on both sides")
+            else:
+                self.logger.warning("No film gate found - frames are not cropped")
+                self.crop_frames = False
+
+        if not self.crop_frames:
+            return
+
+        picture_width = self.width - self.left_crop - self.right_crop
+        picture_height = self.height - self.top_crop - self.bottom_crop
+        if self.gate_output == "crop":
+            self.width, self.height = picture_width, picture_height
+        self.logger.info(f"Film gate: {picture_width} x {picture_height} at column {self.left_crop}, row {self.top_crop} - "
+                         + {"reflect": "padded back by reflection",
+                            "black": "padded back with black",
+                            "crop": "encoded at this size"}[self.gate_output])
 
     def _initialize_bracketing(self) -> None:
         self.times: ndarray[np.float32] = np.asarray([128.0, 256.0, 64.0], dtype=np.float32)
         self.calibrate_debevec = cv2.createCalibrateDebevec()
-        self.merge_debevec = cv2.createMergeDebevec()
+        self.response: ndarray[np.float32] | None = None
+
+        if self.hdr_mode == "fusion":
+            # Exposure fusion blends the 8-bit exposures directly - no response curve, no tone mapper
+            self.logger.info(f"HDR mode: exposure fusion (Mertens) with weights at 1/{self.fusion_scale} resolution")
+            self._initialize_hdr_operators()
+            return
+
+        if self.merge_engine == "lut" and self.calibration != "reel":
+            self.logger.warning("Merge engine 'lut' needs a fixed camera response curve - using calibration per reel")
+            self.calibration = "reel"
+
+        if self.calibration == "reel":
+            self.response = self._initialize_response()
+
+        self.logger.info(f"Merge engine: {self.merge_engine}")
 
+        self._log_tone_mapper()
+
+        self._initialize_hdr_operators()
+
+    def _log_tone_mapper(self) -> None:
         self.logger.info(f"Tone mapper preset: {self.tone_mapper_preset} using: {self.tone_mapper}")
 
         if self.tone_mapper == "drago":
             self.logger.info(f"Using TonemapDrago (bias={self.drago_bias})")
-            self.tone_map = cv2.createTonemapDrago(self.drago_bias)
 
         elif self.tone_mapper == "reinhard":
             self.logger.info(
                 f"Using TonemapReinhard (gamma={self.reinhard_gamma}, intensity={self.reinhard_intensity}, light_adapt={self.reinhard_light_adapt}, color_adapt={self.reinhard_color_adapt})")
-            self.tone_map = cv2.createTonemapReinhard(self.reinhard_gamma, self.reinhard_intensity,
-                                                      self.reinhard_light_adapt, self.reinhard_color_adapt)
 
         elif self.tone_mapper == "mantiuk":
             self.logger.info(
                 f"Using TonemapMantiuk (scale={self.mantiuk_scale}, saturation={self.mantiuk_saturation}, bias={self.mantiuk_bias})")
-            self.tone_map = cv2.createTonemapMantiuk(self.mantiuk_scale, self.mantiuk_saturation, self.mantiuk_bias)
 
+    def _initialize_hdr_operators(self) -> None:
+        # OpenCV algorithm objects cannot be pickled; worker processes rebuild them from the settings
+        self.calibrate_debevec = cv2.createCalibrateDebevec()
+        self.merge_debevec = cv2.createMergeDebevec()
+        self.lut_merge: LutMergeDebevec | None = None
+        self.merge_mertens: cv2.MergeMertens | ReducedMergeMertens | None = None
+
+        if self.hdr_mode == "fusion":
+            self.merge_mertens = cv2.createMergeMertens() if self.fusion_scale == 1 \
+                else ReducedMergeMertens(self.fusion_scale)
+            return
+
+        if self.merge_engine == "lut" and self.response is not None:
+            self.lut_merge = LutMergeDebevec(self.times, self.response)
+
+        self.tone_map = self._create_tone_map()
+
+    def _create_tone_map(self) -> cv2.Tonemap:
+        if self.tone_mapper == "drago":
+            return cv2.createTonemapDrago(self.drago_bias)
+
+        elif self.tone_mapper == "reinhard":
+            return cv2.createTonemapReinhard(self.reinhard_gamma, self.reinhard_intensity,
+                                             self.reinhard_light_adapt, self.reinhard_color_adapt)
+
+        elif self.tone_mapper == "mantiuk":
+            return cv2.createTonemapMantiuk(self.mantiuk_scale, self.mantiuk_saturation, self.mantiuk_bias)
+
+        raise ValueError(f"Unknown tone mapper: {self.tone_mapper}")
+
+    def _sampled_groups(self, groups: List[List[Image]]) -> List[List[Image]]:
+        # Frame groups spread evenly over the reel, so calibration and gate detection see all parts of the film
+        count = min(self.calibration_samples, len(groups))
+        indices = np.linspace(0, len(groups) - 1, count).round().astype(int)
+        return [groups[i] for i in indices]
+
+    @staticmethod
+    def _file_stats(groups: List[List[str]]) -> List[list]:
+        # Name, size and modification time of the files a sidecar is computed from - it is valid while they match
+        stats = []
+        for paths in groups:
+            for path in paths:
+                stat = os.stat(path)
+                stats.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        return stats
+
+    def _initialize_response(self) -> ndarray[np.float32] | None:
+        # The camera and the exposure times stay the same for the whole reel, so the response
+        # curve is estimated once and kept in a sidecar file next to the frames.
+        groups = self._group_paths()
+        if len(groups) == 0:
+            return None
+
+        # Spread the sampled triplets evenly over the reel and calibrate on one mosaic per exposure,
+        # so the least squares fit sees pixels from all parts of the film.
+        sampled_paths = self._sampled_groups(groups)
+        count = len(sampled_paths)
+
+        response_file = self.path / "camera_response.json"
+        files = self._file_stats(sampled_paths) if self.source.files else None
+        if files is not None and not self.recalibrate:
+            try:
+                data = json.loads(response_file.read_text(encoding="utf-8"))
+                if data.get("files") == files:
+                    response = np.array(data["response"], dtype=np.float32)
+                    if response.shape == (256, 1, 3):
+                        self.logger.info(f"Using camera response curve from {str(response_file)}")
+                        return response
+                    self.logger.warning(f"Ignoring {str(response_file)} - unexpected shape {response.shape}")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                self.logger.warning(f"Ignoring {str(response_file)} - {e}")
+
+        sampled = [self._load_group(paths) for paths in sampled_paths]
+        mosaic = [cv2.vconcat([images[k] for images in sampled]) for k in range(len(self.times))]
+
+        calibrate_debevec = cv2.createCalibrateDebevec(samples=70 * count)
+        with self.metrics.time("calibration"):
+            response = calibrate_debevec.process(mosaic, self.times)
+        self.logger.info(f"Calibrated camera response curve from {count} frames")
+
+        if self.proxy > 1:
+            # Downscaled frames mix neighbouring pixels - keep the sidecar for a calibration at full size
+            return response
+        if files is None:
+            # Frames in memory have no directory to keep the sidecar in
+            return response
+        if self.follow:
+            # Only the first frames of the reel have arrived - usually the leader, not a curve for the whole film
+            return response
+
+        try:
+            response_file.write_text(json.dumps({"files": files, "response": response.tolist()}), encoding="utf-8")
+            if self.frame_index is not None:
+                self.frame_index.refresh()
+        except OSError as e:
+            self.logger.warning(f"Could not save camera response curve to {str(response_file)} - {e}")
+
+        return response
+
+    def _measure_frame_cost(self, groups: List[List[str]]) -> FrameCost:
+        # The first group warms up lazily allocated buffers, the second one is measured
+        self._process_group(self._load_group(groups[0]))
+        paths = groups[min(1, len(groups) - 1)]
+
+        start = time.perf_counter()
+        images = self._load_group(paths)
+        decoded = time.perf_counter()
+        # NumPy and the OpenCV bindings allocate their arrays through the Python allocator, so tracemalloc sees them
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            frame = self._process_group(images)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        processed = time.perf_counter()
+
+        return FrameCost(decode_seconds=decoded - start, process_seconds=processed - decoded,
+                         group_bytes=sum(image.nbytes for image in images), frame_bytes=frame.nbytes,
+                         working_bytes=peak)
+
+    def _initialize_resources(self) -> None:
+        self.tuner: PipelineTuner | None = None
+        if not (self.auto_workers or self.auto_batch_size or self.memory_limit is not None):
+            return
+
+        groups = self._group_paths()
+        if len(groups) == 0:
+            return
+
+        cost = self._measure_frame_cost(groups)
+        if self.executor == "process":
+            cost = cost._replace(working_bytes=cost.working_bytes + WORKER_PROCESS_BYTES)
+
+        rss = current_rss_bytes() or 0
+        if self.memory_limit is not None:
+            limit: int | None = int(self.memory_limit * 2 ** 30)
         else:
-            raise ValueError(f"Unknown tone mapper: {self.tone_mapper}")
+            # Leave a quarter of the available memory to the rest of the machine
+            available = available_memory_bytes()
+            limit = rss + int(0.75 * available / self.memory_share) if available is not None else None
+
+        # ffmpeg runs in processes of its own, but takes from the same memory
+        encoders = len(self.renditions) * self.segments
+        encoder_bytes = encoders * ENCODER_FRAMES * self.width * self.height * 3 // 2
+        # Every segment reads ahead its own window of encoded image files
+        read_ahead_bytes = self.segments * self.read_ahead * os.path.getsize(groups[0][0]) * 9 // 8 \
+            if self.executor == "thread" and self.source.files else 0
+        budget = max(0, limit - rss - encoder_bytes - read_ahead_bytes) if limit is not None else None
+
+        group_size = 3 if self.bracketing else 1
+        plan = plan_pipeline(cost, usable_cpus(), budget,
+                             num_workers=None if self.auto_workers else self.num_workers,
+                             depth=None if self.auto_batch_size else self._pipeline_depth())
+        if not self.auto_workers and plan.num_workers < self.num_workers:
+            self.logger.warning(f"Only {plan.num_workers} of {self.num_workers} workers fit into the memory limit")
+        if not self.auto_batch_size and plan.depth < self._pipeline_depth():
+            self.logger.warning(f"Only {plan.depth * group_size} of {self.batch_size} images in flight fit into the memory limit")
+        self.num_workers = plan.num_workers
+        self.batch_size = min(plan.depth * group_size, 498)
+
+        self.logger.info(
+            f"Frame cost: {1000 * cost.decode_seconds:.0f} ms decode, {1000 * cost.process_seconds:.0f} ms processing, "
+            f"{cost.working_bytes / 2 ** 20:.0f} MB working memory, {cost.group_bytes / 2 ** 20:.1f} MB per frame group - "
+            f"using {self.num_workers} workers and {self.batch_size} images in flight"
+            + (f" within {budget / 2 ** 20:.0f} MB for frames" if budget is not None else ""))
+
+        if limit is not None and self.executor == "thread":
+            self.tuner = PipelineTuner(self.logger, lambda: self.metrics.frames, limit - encoder_bytes - read_ahead_bytes,
+                                       min_depth=self.num_workers)
 
     def _initialize_video_writer(self) -> None:
 
-        output = str(self.opath / f"{self.name}.{self.output_format}")
-        quality = getattr(self, "quality", "better").lower()
-
-        X264_PRESETS = {
-            "preview": {
-                "crf": "26",
-                "preset": "ultrafast",
-                "x264_params": (
-                    "aq-mode=1:"
-                    "psy-rd=1.0"
-                ),
-            },
-            "good": {
-                "crf": "20",
-                "preset": "medium",
-                "x264_params": None,
-            },
-            "better": {
-                "crf": "18",
-                "preset": "slow",
-                "x264_params": (
-                    "aq-mode=0:"
-                    "psy-rd=0.5:"
-                    "deblock=0,0"
-                ),
-            },
-            "best": {
-                "crf": "10",
-                "preset": "veryslow",
-                "x264_params": (
-                    "aq-mode=0:"
-                    "psy-rd=0:"
-                    "bframes=0:"
-                    "deblock=0,0"
-                ),
-            },
-        }
+        if self.pipe_format == "yuv420p" and (self.width % 2 or self.height % 2):
+            self.logger.warning(f"Pipe format yuv420p needs an even width and height - using bgr24 for {self.width} x {self.height}")
+            self.pipe_format = "bgr24"
+
+        if self.follow and (self.segments > 1 or self.checkpoint_frames > 0):
+            # The number of frames is not known up front, so there are no frame ranges to split into
+            self.logger.info("Follow mode encodes in one go - segments and checkpoints are disabled")
+            self.segments = 1
+            self.checkpoint_frames = 0
+            self.resume = False
+
+        if self.duplicate_tolerance > 0 and self.executor == "process":
+            # Worker processes load and process a group in one go - there is no point to skip processing
+            self.logger.warning("--duplicate-tolerance needs --executor thread - duplicate frames are processed")
+            self.duplicate_tolerance = 0.0
+
+        if self.resume and self.checkpoint_frames == 0:
+            self.logger.warning("--resume needs checkpoints - ignored with --checkpoint-frames 0")
+            self.resume = False
+
+        if len(self.renditions) > 1:
+            self.logger.info("Additional renditions: " + ", ".join(
+                f"{self._output_file(r)} ({r.quality}" + (f", {r.size[0]} x {r.size[1]})" if r.size else ")")
+                for r in self.renditions[1:]))
+
+        if self.cpu_split is not None:
+            self._initialize_cpu_split()
+
+        # Started by assemble_video, so a generator that only hands out its frames never runs ffmpeg
+        self.encoders: List[FfmpegSink] = []
+
+    def _measure_encode_seconds(self, frame: ndarray, count: int = 8) -> float:
+        # One x264 thread, so the time is the CPU time per frame; shifted copies keep x264 from skipping them
+        cmd = self._encoder_command("-", rendition=self.renditions[0], x264_threads=1)
+        i = cmd.index("-movflags")
+        cmd = cmd[:i] + cmd[i + 2:-1] + ["-f", "null", "-"]
+        start = time.perf_counter()
+        with self._start_encoder(cmd) as encoder:
+            for k in range(count):
+                encoder.write(np.roll(frame, 8 * k, axis=1))
+        return (time.perf_counter() - start) / count
+
+    def _initialize_cpu_split(self) -> None:
+        if usable_cpus() < 2:
+            self.logger.info("--cpu-split needs at least 2 CPUs - HDR workers and encoders share the CPU")
+            return
+
+        if self.sweep_presets is not None:
+            encoders = len(self.sweep_presets or TONE_MAPPER_PRESETS) if self.sweep_range is not None else 1
+        else:
+            encoders = len(self.renditions) * self.segments
+        hdr_share = self.cpu_split
+        if hdr_share == "auto":
+            groups = self._group_paths()
+            if len(groups) == 0:
+                return
+            start = time.perf_counter()
+            frame = self._process_group(self._load_group(groups[0]))
+            hdr_seconds = time.perf_counter() - start
+            encode_seconds = self._measure_encode_seconds(frame)
+            # Every rendition is encoded on its own, segments only divide the frames
+            hdr_share = hdr_seconds / (hdr_seconds + len(self.renditions) * encode_seconds)
+            self.logger.info(f"Measured {1000 * hdr_seconds:.0f} ms HDR processing and {1000 * encode_seconds:.0f} ms "
+                             f"x264 encoding per frame and CPU")
+
+        split = split_cpus(hdr_share)
+
+        if self.auto_workers:
+            self.num_workers = min(self.num_workers, len(split.hdr_cpus))
+        # Frame threads of all encoders running at the same time share the encoder CPUs
+        self.x264_threads = max(1, -(-len(split.encoder_cpus) // encoders))
+        if hasattr(os, "sched_setaffinity"):
+            # Only the threads of this reel are pinned, while it is assembled - see _on_hdr_cpus
+            self.hdr_cpus, self.encoder_cpus = split
+            placement = f"HDR on CPUs {cpu_list(split.hdr_cpus)}, encoders on CPUs {cpu_list(split.encoder_cpus)}"
+        else:
+            placement = "not pinned, this platform has no CPU affinity"
+        self.logger.info(f"CPU split: {len(split.hdr_cpus)} CPUs for {self.num_workers} HDR workers, "
+                         f"{len(split.encoder_cpus)} CPUs for {encoders} encoders with {self.x264_threads} x264 threads each - "
+                         f"{placement}")
+
+    def _output_file(self, rendition: Rendition) -> str:
+        return str(self.opath / f"{rendition.name}.{rendition.output_format}")
 
+    def _encoder_command(self, output: str, closed_gop: bool = False, rendition: Rendition | None = None,
+                         x264_threads: int | None = None) -> List[str]:
+        quality = (rendition.quality if rendition is not None else getattr(self, "quality", "better")).lower()
         cfg = X264_PRESETS.get(quality, X264_PRESETS["better"])
 
+        # Frames converted by OpenCV (COLOR_BGR2YUV_I420) are BT.601 limited range YUV; declare exactly that,
+        # so ffmpeg passes them to x264 without another conversion
+        if self.pipe_format == "yuv420p":
+            color_range, colorspace = "tv", "smpte170m"
+        else:
+            color_range, colorspace = "pc", "bt709"
+
         cmd = [
             "ffmpeg",
             "-hide_banner",
@@ -224,17 +912,23 @@ class GenerateVideo:
 
             # ---- RAW INPUT ----
             "-f", "rawvideo",
-            "-pix_fmt", "bgr24",
+            "-pix_fmt", self.pipe_format,
             "-video_size", f"{self.width}x{self.height}",
-            "-framerate", str(self.fps),
+            # A proxy of every n-th frame keeps the running time of the reel
+            "-framerate", str(self.fps / self.proxy_step if self.proxy_step > 1 else self.fps),
 
-            "-color_range", "pc",
-            "-colorspace", "bt709",
+            "-color_range", color_range,
+            "-colorspace", colorspace,
             "-color_primaries", "bt709",
             "-color_trc", "bt709",
 
             "-i", "-",
+        ]
 
+        if rendition is not None and rendition.size is not None:
+            cmd += ["-vf", f"scale={rendition.size[0]}:{rendition.size[1]}:flags=lanczos"]
+
+        cmd += [
             # ---- DELIVERY ----
             "-c:v", "libx264",
             "-pix_fmt", "yuv420p",
@@ -244,60 +938,67 @@ class GenerateVideo:
             "-crf", cfg["crf"],
             "-preset", cfg["preset"],
 
-            "-colorspace", "bt709",
+            "-colorspace", colorspace,
             "-color_primaries", "bt709",
             "-color_trc", "bt709",
 
             "-movflags", "+faststart",
         ]
 
-        if cfg["x264_params"]:
-            cmd += ["-x264-params", cfg["x264_params"]]
-
-        cmd.append(output)
+        if closed_gop:
+            # Segments must start with an IDR frame and must not reference frames of other segments
+            cmd += ["-flags", "+cgop"]
 
-        self.ffmpeg = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        self._pipe_ffmpeg_stderr_to_logger()
-
-    def _pipe_ffmpeg_stderr_to_logger(self):
-        def reader():
-            for line in self.ffmpeg.stderr:
-                line = line.strip()
-                if not line:
-                    continue
-
-                # Classify severity
-                if "error" in line.lower():
-                    self.logger.error(f"[ffmpeg] {line}")
-                elif "warning" in line.lower():
-                    self.logger.warning(f"[ffmpeg] {line}")
-                else:
-                    self.logger.info(f"[ffmpeg] {line}")
+        x264_params = [cfg["x264_params"]] if cfg["x264_params"] else []
+        x264_threads = x264_threads or self.x264_threads
+        if x264_threads is not None:
+            # Instead of x264's default of 1.5 threads per CPU of the machine; slow presets have a long lookahead
+            x264_params += [f"threads={x264_threads}", f"lookahead-threads={max(1, x264_threads // 4)}"]
+        if x264_params:
+            cmd += ["-x264-params", ":".join(x264_params)]
 
-        t = threading.Thread(target=reader, daemon=True)
-        t.start()
+        cmd.append(output)
 
-    def _preload_image_groups(self, grouped_paths: List[List[str]]) -> List[List[ndarray]]:
-        def load_group(paths: List[str]) -> List[ndarray]:
-            images = []
+        return cmd
+
+    def _start_encoder(self, cmd: List[str]) -> FfmpegSink:
+        return FfmpegSink(cmd, self.logger, self.encoder_cpus)
+
+    def _read_image(self, source: Image | ImageBytes) -> ndarray | None:
+        if isinstance(source, str):
+            return cv2.imread(source, self.imread_flags)
+        if isinstance(source, ndarray):
+            # Decoded images of an in-memory source are reduced like files decoded at 1/proxy size
+            return source if self.proxy == 1 else cv2.resize(
+                source, (source.shape[1] // self.proxy, source.shape[0] // self.proxy), interpolation=cv2.INTER_AREA)
+        return cv2.imdecode(source.data, self.imread_flags) if source.data is not None else None
+
+    def _load_group(self, paths: List[str] | List[ImageBytes]) -> List[ndarray]:
+        images = []
+        try:
+            with self.metrics.time("decode"):
+                for path in paths:
+                    img = self._read_image(path)
+                    if isinstance(path, ImageBytes):
+                        path.release()
+                    if img is None:
+                        raise ValueError(f"Failed to load image: {path}")
+                    img = cv2.flip(img, self.flip) if self.flip != 2 else img
+
+                    # Crop out black borders before HDR merge
+                    # Assume 16mm image center is ~10.3:7.5 inside 1920x1080 unless the gate is detected (--gate auto)
+                    if self.crop_frames:
+                        img = img[self.top_crop: img.shape[0] - self.bottom_crop,
+                                  self.left_crop: img.shape[1] - self.right_crop]
+
+                    images.append(img)
+        finally:
+            # Files of the group not decoded after a failure give their read-ahead slots back as well
             for path in paths:
-                img = cv2.imread(path, cv2.IMREAD_COLOR)
-                if img is None:
-                    raise ValueError(f"Failed to load image: {path}")
-                img = cv2.flip(img, self.flip) if self.flip != 2 else img
-
-                # Crop out black borders before HDR merge
-                # Assume 16mm image center is ~10.3:7.5 inside 1920x1080
-                # Calculate crop dynamically if desired, or hardcode for now:
-                if self.bracketing:
-                    img = img[:, self.left_crop: img.shape[1] - self.right_crop]
-
-                images.append(img)
-
-            return images
+                if isinstance(path, ImageBytes):
+                    path.release()
 
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            return list(executor.map(load_group, grouped_paths))
+        return images
 
     # see https://www.toptal.com/opencv/python-image-processing-in-computational-photography
     # method can be removed if results are not satisfying
@@ -307,70 +1008,779 @@ class GenerateVideo:
         min_count = min_fraction * hdr.size
         delta_range = ranges[1] - ranges[0]
 
-        image = hdr.copy()
-        for i in range(len(counts)):
-            if counts[i] < min_count:
-                image[image >= ranges[i + 1]] -= delta_range
-            ranges -= delta_range
+        if delta_range <= 0:
+            return cv2.normalize(hdr, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
 
-        normalized_image = cv2.normalize(image, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
+        # Each sparse bin lowers every intensity above the first bin by one bin width until it has
+        # reached the first bin, so the total shift of a pixel only depends on the bin it starts in.
+        # It is looked up per pixel from a cumulative shift table in one pass over the image.
+        sparse_bins = np.count_nonzero(counts < min_count)
+        shift = (np.minimum(np.arange(len(ranges)), sparse_bins) * delta_range).astype(np.float32)
+
+        image = np.subtract(hdr, ranges[0], dtype=np.float32)
+        image *= np.float32(1.0 / delta_range)
+        bins = image.astype(np.int32)
+        np.minimum(bins, len(ranges) - 1, out=bins)
+        np.take(shift, bins, out=image)
+        np.subtract(hdr, image, out=image)
+
+        normalized_image = cv2.normalize(image, image, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
 
         return normalized_image
 
-    def process_batch(self, image_paths: List[str]) -> List[ndarray]:
-        def group(sequence, chunk_size) -> List[List[str]]:
-            return [sequence[i:i + chunk_size] for i in range(0, len(sequence), chunk_size)]
+    def _process_group(self, images: List[ndarray]) -> ndarray:
+        if not self.bracketing:
+            frame = self._pad_frame(images[0]) if self.crop_frames else images[0]
+        elif self.merge_mertens is not None:
+            frame = self._fused_frame(images)
+        else:
+            frame = self._hdr_frame(images)
+        return self._pipe_frame(frame)
+
+    def _pipe_frame(self, frame: ndarray) -> ndarray:
+        # Converting here runs in the parallel workers and halves the bytes sent through the pipe
+        if self.pipe_format == "yuv420p":
+            with self.metrics.time("convert"):
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420)
+
+        return frame
+
+    def _hdr_frame(self, images: List[ndarray]) -> ndarray:
+        hdr = self._merged_hdr(images)
+        with self.metrics.time("tone_map"):
+            ldr = self.tone_map.process(hdr)
+        return self._ldr_frame(ldr)
+
+    def _merged_hdr(self, images: List[ndarray]) -> ndarray[np.float32]:
+        with self.metrics.time("merge"):
+            if self.lut_merge is not None:
+                hdr = self.lut_merge.process(images)
+            else:
+                response = self.response if self.response is not None else self.calibrate_debevec.process(images, self.times)
+                hdr = self.merge_debevec.process(images, self.times, response)
+        with self.metrics.time("count_tonemap"):
+            return self.countTonemap(hdr, min_fraction=0.0005)
+
+    def _fused_frame(self, images: List[ndarray]) -> ndarray:
+        with self.metrics.time("fusion"):
+            fused = self.merge_mertens.process(images)
+        # Fusion is display referred, but may slightly overshoot [0, 1]
+        np.multiply(fused, 255, out=fused)
+        np.clip(fused, 0, 255, out=fused)
+        return self._pad_frame(fused.astype(dtype=np.uint8))
+
+    def _ldr_frame(self, ldr: ndarray[np.float32]) -> ndarray:
+        # Scale in place and convert to the final 8-bit frame without another float temporary
+        np.multiply(ldr, 256, out=ldr)
+        return self._pad_frame(ldr.astype(dtype=np.uint8))
+
+    def _pad_frame(self, frame: ndarray) -> ndarray:
+        if self.gate_output == "crop":
+            return frame
+
+        # Pad back to 1920x1080 - flat black costs the encoder next to no bits
+        frame = cv2.copyMakeBorder(
+            frame,
+            top=self.top_crop,
+            bottom=self.bottom_crop,
+            left=self.left_crop,
+            right=self.right_crop,
+            borderType=cv2.BORDER_REFLECT_101 if self.gate_output == "reflect" else cv2.BORDER_CONSTANT,
+            value=(0, 0, 0)  # Black padding
+        )
+
+        return frame
+
+    def _group_paths(self) -> List[List[str]]:
+        group_size = 3 if self.bracketing else 1
+        return [self.image_list[i:i + group_size]
+                for i in range(0, len(self.image_list), group_size * self.proxy_step)]
+
+    def __getstate__(self) -> dict:
+        # Only the settings travel to worker processes; the ffmpeg process and the OpenCV objects stay behind
+        state = self.__dict__.copy()
+        for key in ("encoders", "cpu_slots", "metrics", "profiler", "tuner", "calibrate_debevec", "merge_debevec", "tone_map", "lut_merge", "merge_mertens", "source",
+                    "image_list", "frame_index", "frame_cache", "cached_frames", "cache_writer"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        # Worker processes keep their records and hand them to the main process with every frame
+        self.metrics = StageMetrics(self.logger, keep_records=True)
+        self.profiler = None
+        if self.bracketing:
+            self._initialize_hdr_operators()
 
+    def _pipeline_depth(self) -> int:
         group_size = 3 if self.bracketing else 1
-        grouped_paths: List[List[str]] = group(image_paths, group_size)
-
-        preloaded_images: List[List[ndarray]] = self._preload_image_groups(grouped_paths)
-
-        def process(images: List[ndarray]) -> ndarray:
-            if not self.bracketing:
-                return images[0]
-            response = self.calibrate_debevec.process(images, self.times)
-            hdr = self.merge_debevec.process(images, self.times, response)
-            hdr_normalized = self.countTonemap(hdr, min_fraction=0.0005)
-            ldr = self.tone_map.process(hdr_normalized)
-
-            # Pad back to 1920x1080
-            if self.bracketing:
-                ldr = cv2.copyMakeBorder(
-                    ldr,
-                    top=0,
-                    bottom=0,
-                    left=self.left_crop,
-                    right=self.right_crop,
-                    borderType=cv2.BORDER_REFLECT_101,
-                    value=(0, 0, 0)  # Black padding
-                )
-
-            return (ldr * 256).astype(dtype=np.uint8)
-
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            return list(executor.map(process, preloaded_images))
+        return max(self.num_workers, self.batch_size // group_size)
+
+    def _budgeted(self, function: Callable) -> Callable:
+        # In a batch, every load and every frame processed takes one of the CPU slots shared by all reels
+        if self.cpu_slots is None:
+            return function
+
+        def run(*args):
+            with self.metrics.time("cpu_slot_wait"):
+                self.cpu_slots.acquire()
+            try:
+                return function(*args)
+            finally:
+                self.cpu_slots.release()
+
+        return run
+
+    def _profiled(self, function: Callable) -> Callable:
+        return self.profiler.wrap(function) if self.profiler is not None else function
+
+    def _load_unique_group(self, detector: DuplicateDetector, load: Callable, index: int,
+                           paths: List[str] | List[ImageBytes]) -> List[ndarray] | None:
+        # None for a duplicate - its images are dropped right away and processing is skipped.
+        # Only decoding takes a CPU slot of a batch - deciding waits for the group before, whose
+        # loader may itself be waiting for a slot.
+        try:
+            images = load(paths)
+            with self.metrics.time("duplicate_check"):
+                duplicate = detector.decide(index, image_name(paths[0], index), images)
+        except BaseException:
+            detector.skip(index)
+            raise
+        return None if duplicate else images
+
+    def _read_ahead_groups(self, groups: Iterable[List[str]]) -> Iterable[List[str]] | Iterable[List[ImageBytes]]:
+        # The loaders only decode - storage latency is hidden behind the frames in the read-ahead window
+        if self.read_ahead == 0 or not self.source.files:
+            return groups
+        # A group is only handed on once all its files are read
+        window = max(self.read_ahead, 3 if self.bracketing else 1)
+        return ReadAhead(window, self.read_threads, self.metrics).groups(groups)
+
+    def _processed_frames(self, groups: Iterable[List[str]], num_workers: int | None = None,
+                          depth: int | None = None, start: int = 0) -> Iterator[ndarray]:
+        num_workers = num_workers or self.num_workers
+        depth = depth or self._pipeline_depth()
+
+        if self.executor == "process":
+            yield from self._processed_frames_in_processes(groups, num_workers, depth)
+            return
+
+        load: Callable = self._budgeted(self._profiled(self._load_group))
+        process: Callable = self._process_group
+        detector: DuplicateDetector | None = None
+        groups = self._read_ahead_groups(groups)
+        if self.duplicate_tolerance > 0:
+            # The first group of every frame range is processed, so ranges do not depend on each other
+            detector = DuplicateDetector(self.duplicate_tolerance, start)
+            groups = enumerate(groups, start)
+            decode = load
+            load = lambda entry: self._load_unique_group(detector, decode, *entry)
+            process = lambda images: None if images is None else self._process_group(images)
+
+        # Frames are loaded, processed and written concurrently; the number of frames in flight is
+        # bounded by the batch size, so memory no longer grows with the length of a batch.
+        pipeline = FramePipeline(load=load,
+                                 process=self._budgeted(self._profiled(process)),
+                                 num_loaders=num_workers,
+                                 num_workers=num_workers,
+                                 depth=depth)
+        try:
+            with self.metrics.gauge(pipeline.queue_depths), \
+                    self.tuner.track(pipeline) if self.tuner is not None else nullcontext():
+                previous: ndarray | None = None
+                for frame in pipeline.run(groups):
+                    # A duplicate shows the frame before it again
+                    frame = previous if frame is None else frame
+                    previous = frame
+                    yield frame
+        finally:
+            if detector is not None:
+                self.duplicates.extend(detector.duplicates)
+
+    def _processed_frames_in_processes(self, groups: List[List[str]], num_workers: int,
+                                       depth: int) -> Iterator[ndarray]:
+        # Worker processes load and process whole frame groups and hand the result back through a ring
+        # of shared memory slots, so only a slot number and a shape cross the process boundary.
+        frame_bytes = self.width * self.height * 3
+        slots = max(2, min(depth, 2 * num_workers))
+        memory = shared_memory.SharedMemory(create=True, size=frame_bytes * slots)
+        pending: Deque[Future] = deque()
+
+        def acquire_cpu_slot() -> bool:
+            # In a batch every frame group in flight holds one of the shared CPU slots until it is consumed.
+            # Only wait for a slot with nothing in flight - waiting while holding slots could deadlock the reels.
+            return self.cpu_slots is None or self.cpu_slots.acquire(blocking=not pending)
+
+        try:
+            # spawn behaves the same on all platforms and in the frozen executables (see freeze_support in main)
+            with ProcessPoolExecutor(max_workers=num_workers,
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_initialize_worker_process,
+                                     initargs=(self, memory.name, frame_bytes)) as executor, \
+                    self.metrics.gauge(lambda: {"in_flight": len(pending)}):
+                remaining = iter(enumerate(groups))
+                entry = next(remaining, None)
+                while entry is not None or pending:
+                    # The slot of the frame consumed last is free again for the next frame group
+                    while entry is not None and len(pending) < slots and acquire_cpu_slot():
+                        index, paths = entry
+                        pending.append(executor.submit(_process_group_into_slot, paths, index % slots))
+                        entry = next(remaining, None)
+
+                    future = pending.popleft()
+                    try:
+                        slot, shape, pid, records = future.result()
+                    finally:
+                        if self.cpu_slots is not None:
+                            self.cpu_slots.release()
+                    self.metrics.merge(pid, records)
+                    frame = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf, offset=slot * frame_bytes)
+                    yield frame
+                    del frame
+        finally:
+            if self.cpu_slots is not None:
+                for _ in pending:
+                    self.cpu_slots.release()
+            try:
+                memory.close()
+            except BufferError:
+                pass
+            memory.unlink()
+
+    def _frame_shape(self) -> Tuple[int, ...]:
+        if self.pipe_format == "yuv420p":
+            return self.height * 3 // 2, self.width
+        return self.height, self.width, 3
+
+    def _open_frame_cache(self, count: int) -> None:
+        self.cached_frames: np.memmap | None = None
+        self.cache_writer: FrameCacheWriter | None = None
+        if self.frame_cache is None or count == 0:
+            return
+
+        key = self._fingerprint(self._processing_parameters())
+        self.cached_frames = self.frame_cache.open(key, count, self._frame_shape())
+        if self.cached_frames is not None:
+            self.logger.info(f"Encoding {count} processed frames from the frame cache - decoding and HDR are skipped")
+        else:
+            self.cache_writer = self.frame_cache.create(key, count, self._frame_shape())
 
-    def assemble_video(self) -> None:
-        if self.gui:
-            progress_bar = tqdm(range(0, len(self.image_list), self.batch_size), unit_scale=self.batch_size,
-                                desc="Generation progress", unit="frames", file=TqdmLogger(self.logger), mininterval=5)
+    def _close_frame_cache(self, completed: bool) -> None:
+        self.cached_frames = None
+        if self.cache_writer is not None:
+            if completed and self.cache_writer.commit():
+                self.logger.info(f"Processed frames stored in the frame cache {str(self.frame_cache.directory)}")
+            else:
+                self.cache_writer.discard()
+            self.cache_writer = None
+
+    def _frames_for_range(self, groups: List[List[str]], start: int, end: int, num_workers: int | None = None,
+                          depth: int | None = None) -> Iterator[ndarray]:
+        if self.cached_frames is not None:
+            yield from self.cached_frames[start:end]
+            return
+
+        for index, frame in enumerate(self._processed_frames(groups[start:end], num_workers, depth, start), start):
+            if self.cache_writer is not None:
+                with self.metrics.time("cache_write"):
+                    self.cache_writer.write(index, frame)
+            yield frame
+
+    def _write_frame(self, encoder: FrameSink, frame: ndarray) -> None:
+        # The write blocks while ffmpeg is busy, so its time is the back-pressure of the encoder
+        with self.metrics.time("pipe_write"):
+            encoder.write(frame)
+
+    def _encode_frames(self, encoders: List[FrameSink], frames: Iterable[ndarray], progress_bar: tqdm) -> None:
+        # Time spent waiting for the next processed frame - the encoder is starved
+        frames = self.metrics.timed_iterator("frame_wait", frames)
+        if len(encoders) == 1:
+            for img in frames:
+                self._write_frame(encoders[0], img)
+                self.metrics.count_frame()
+                progress_bar.update(1)
+                del img
+            return
+
+        # Every rendition gets the same frames; the slowest encoder sets the pace
+        fan_out = EncoderFanOut(encoders, self._write_frame)
+        try:
+            with self.metrics.gauge(fan_out.queue_depths):
+                for img in frames:
+                    # Frames of worker processes live in shared memory slots that are reused for later frames
+                    fan_out.write(img.copy() if self.executor == "process" else img)
+                    self.metrics.count_frame()
+                    progress_bar.update(1)
+                    del img
+        finally:
+            fan_out.close()
+
+    def _tone_mapper_settings(self) -> dict:
+        return {
+            "tone_mapper_preset": self.tone_mapper_preset,
+            "tone_mapper": self.tone_mapper,
+            "drago_bias": self.drago_bias,
+            "reinhard_gamma": self.reinhard_gamma,
+            "reinhard_intensity": self.reinhard_intensity,
+            "reinhard_light_adapt": self.reinhard_light_adapt,
+            "reinhard_color_adapt": self.reinhard_color_adapt,
+            "mantiuk_scale": self.mantiuk_scale,
+            "mantiuk_saturation": self.mantiuk_saturation,
+            "mantiuk_bias": self.mantiuk_bias,
+        }
+
+    def _processing_parameters(self) -> dict:
+        # Everything that changes the processed frames, but not how they are encoded
+        parameters = {
+            "bracketing": self.bracketing,
+            "flip": self.flip,
+            "left_crop": self.left_crop,
+            "right_crop": self.right_crop,
+            "width": self.width,
+            "height": self.height,
+            "pipe_format": self.pipe_format,
+            "merge_engine": self.merge_engine,
+            "calibration": self.calibration,
+        }
+        if self.proxy > 1 or self.proxy_step > 1:
+            parameters.update({"proxy": self.proxy, "proxy_step": self.proxy_step})
+        if self.gate != "fixed" or self.gate_output != "reflect":
+            parameters.update({"top_crop": self.top_crop, "bottom_crop": self.bottom_crop,
+                               "gate_output": self.gate_output})
+        if self.duplicate_tolerance > 0:
+            parameters["duplicate_tolerance"] = self.duplicate_tolerance
+        if self.bracketing and self.hdr_mode == "fusion":
+            parameters.update({"hdr_mode": self.hdr_mode, "fusion_scale": self.fusion_scale})
+        elif self.bracketing:
+            parameters.update(self._tone_mapper_settings())
+        return parameters
+
+    def _encoding_parameters(self, ranges: List[Tuple[int, int]]) -> dict:
+        parameters = self._processing_parameters()
+        parameters.update({
+            "fps": self.fps,
+            "quality": self.quality,
+            "output_format": self.output_format,
+            "ranges": ranges,
+        })
+        if len(self.renditions) > 1:
+            parameters["renditions"] = [list(rendition) for rendition in self.renditions]
+        return parameters
+
+    def _fingerprint(self, parameters: dict) -> str:
+        # Parameters, response curve and input files (name, size, modification time)
+        digest = hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode())
+        if self.bracketing and self.response is not None:
+            digest.update(self.response.tobytes())
+        if not self.source.files:
+            # Frames in memory cannot be recognized again - hashing them would take as long as processing
+            digest.update(os.urandom(16))
         else:
-            progress_bar = tqdm(range(0, len(self.image_list), self.batch_size), unit_scale=self.batch_size,
-                                desc="Generation progress", unit="frames")
+            for path in self.image_list:
+                stat = os.stat(path)
+                digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    def _frame_ranges(self, count: int) -> List[Tuple[int, int]]:
+        # One range per segment, split further into checkpoints where a segment is longer than --checkpoint-frames
+        if self.checkpoint_frames > 0 and -(-count // self.segments) > self.checkpoint_frames:
+            bounds = list(range(0, count, self.checkpoint_frames)) + [count]
+        else:
+            bounds = np.linspace(0, count, min(self.segments, count) + 1).astype(int).tolist()
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _encode_segments(self, groups: List[List[str]], ranges: List[Tuple[int, int]], progress_bar: tqdm) -> None:
+        # Contiguous frame ranges are processed and encoded side by side, each by its own ffmpeg
+        # process with closed GOPs, and joined without re-encoding afterwards.
+        parallel = min(self.segments, len(ranges))
+        num_workers = max(1, self.num_workers // parallel)
+        depth = max(num_workers, self._pipeline_depth() // parallel)
+        # Part files of every frame range, one per rendition
+        segment_files = [[self.opath / f"{rendition.name}.part{k:05d}.{rendition.output_format}"
+                          for rendition in self.renditions] for k in range(len(ranges))]
+
+        # Finished ranges are recorded in a journal next to the output, so an interrupted run can be resumed
+        journal: EncodeJournal | None = None
+        if self.checkpoint_frames > 0:
+            parameters = self._encoding_parameters(ranges)
+            journal = EncodeJournal(self.opath / f"{self.name}.journal.json",
+                                    self._fingerprint(parameters), parameters)
+            if self.resume and journal.load():
+                self.logger.info(f"Resuming - {len(journal.completed)} of {len(ranges)} frame ranges already encoded")
+            else:
+                if self.resume:
+                    self.logger.info("No matching journal found - encoding all frame ranges")
+                journal.start()
+
+        todo = [k for k in range(len(ranges)) if journal is None or not journal.is_completed(k)]
+        progress_bar.update(sum(end - start for k, (start, end) in enumerate(ranges) if k not in todo))
+
+        def encode(k: int) -> None:
+            start, end = ranges[k]
+            encoders = [self._start_encoder(self._encoder_command(str(segment_file), closed_gop=True, rendition=rendition))
+                        for rendition, segment_file in zip(self.renditions, segment_files[k])]
+            try:
+                self._encode_frames(encoders, self._frames_for_range(groups, start, end, num_workers, depth),
+                                    progress_bar)
+            finally:
+                with self.metrics.time("encoder_flush"):
+                    for encoder in encoders:
+                        encoder.close()
+            for encoder, segment_file in zip(encoders, segment_files[k]):
+                if encoder.returncode != 0:
+                    raise RuntimeError(f"ffmpeg failed to encode segment {str(segment_file)}")
+            if journal is not None:
+                journal.commit(k, start, end, segment_files[k])
 
-        for start in progress_bar:
-            end: int = start + self.batch_size
-            batch = self.image_list[start:end]
+        self.logger.info(
+            f"Encoding {len(groups)} frames in {len(ranges)} segments, {parallel} at a time with {num_workers} workers each")
+
+        completed = False
+        try:
+            executor = ThreadPoolExecutor(max_workers=parallel)
+            try:
+                for future in [executor.submit(encode, k) for k in todo]:
+                    future.result()
+            finally:
+                # Do not start any further ranges once one has failed or the run was interrupted
+                executor.shutdown(wait=True, cancel_futures=True)
+
+            with self.metrics.time("concat"):
+                for i, rendition in enumerate(self.renditions):
+                    self._concat_segments([files[i] for files in segment_files], self._output_file(rendition))
+            completed = True
+        finally:
+            # Committed segments are kept for --resume unless the video was assembled
+            if completed or journal is None:
+                for segment_file in (f for files in segment_files for f in files):
+                    segment_file.unlink(missing_ok=True)
+                if journal is not None:
+                    journal.remove()
+
+    def _concat_segments(self, segment_files: List[pathlib.Path], output: str) -> None:
+        list_file = pathlib.Path(output).with_suffix(".segments.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            for segment_file in segment_files:
+                escaped = str(segment_file.resolve()).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
 
-            processed_images = self.process_batch(batch)
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-nostats",
+            "-y",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", str(list_file),
+            "-c", "copy",
+            "-movflags", "+faststart",
+            output,
+        ]
 
-            for img in processed_images:
-                self.ffmpeg.stdin.write(img.tobytes())
-                del img
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        finally:
+            list_file.unlink(missing_ok=True)
+
+        for line in result.stderr.decode(errors="replace").splitlines():
+            if line.strip():
+                self.logger.error(f"[ffmpeg] {line.strip()}")
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to join {len(segment_files)} segments into {output}")
 
-        self.ffmpeg.stdin.close()
-        # self.ffmpeg.wait()
+    def _progress_bar(self, total: int | None, description: str) -> tqdm:
+        if self.gui:
+            return tqdm(total=total, desc=description, unit="frames", file=TqdmLogger(self.logger), mininterval=5)
+        if self.job_name is not None:
+            # Reels of a batch run side by side - their progress bars would overwrite each other
+            return tqdm(total=total, desc=description, unit="frames", file=TqdmLogger(self.logger), mininterval=30)
+        return tqdm(total=total, desc=description, unit="frames")
+
+    def _start_instrumentation(self) -> None:
+        self.metrics.start()
+        if self.tuner is not None:
+            self.tuner.start()
+
+    def _close_instrumentation(self) -> None:
+        if self.tuner is not None:
+            self.tuner.stop()
+        self.metrics.close()
+        if self.profiler is not None:
+            self.profiler.dump(self.profile_file, self.logger)
+            if self.executor == "process":
+                self.logger.info(f"Worker processes wrote their profiles to "
+                                 f"{str(self.profile_file.with_name(self.profile_file.stem + '-<pid>' + self.profile_file.suffix))}")
+
+    def _source_groups(self) -> Iterable[List[Image]]:
+        return islice(self.source.groups(), 0, None, self.proxy_step) if self.follow else self._group_paths()
+
+    def iter_frames(self) -> Iterator[ndarray]:
+        """Yields the processed frames of the source in order, in the pipe format.
+
+        Frames are loaded and processed ahead of the caller, at most --batch-size images at a time.
+        With the process executor a frame is only valid until the next one is taken - copy it to keep it.
+        """
+        return self._processed_frames(self._source_groups())
+
+    @_on_hdr_cpus
+    def write_frames(self, sink: FrameSink) -> int:
+        """Writes the processed frames of the source into ``sink`` and closes it; returns the number of frames."""
+        groups = self._source_groups()
+        progress_bar = self._progress_bar(None if self.follow else len(groups), "Generation progress")
+        self._start_instrumentation()
+        start = time.perf_counter()
+        try:
+            with sink:
+                self._encode_frames([sink], self._processed_frames(groups), progress_bar)
+        finally:
+            self.frames_written = progress_bar.n
+            progress_bar.close()
+            self._close_instrumentation()
+
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"{self.frames_written} frames written to {type(sink).__name__} in {elapsed:.1f} s - "
+                         f"{self.frames_written / elapsed if elapsed > 0 else 0.0:.2f} frames/s")
+
+        if self.duplicate_tolerance > 0:
+            self._report_duplicates()
+        return self.frames_written
+
+    @_on_hdr_cpus
+    def assemble_video(self) -> None:
+        groups = self._source_groups()
+        total = None if self.follow else len(groups)
+
+        progress_bar = self._progress_bar(total, "Generation progress")
+        self._start_instrumentation()
+
+        if not self.follow:
+            self._open_frame_cache(len(groups))
+        elif self.frame_cache is not None:
+            self.logger.info("The frame cache is not used in follow mode")
+        from_cache = getattr(self, "cached_frames", None) is not None
+
+        # A reel that fits into one range is encoded in one piece, without part files and joining them
+        ranges = [] if self.follow else self._frame_ranges(len(groups))
+        completed = False
+        try:
+            if len(ranges) > 1:
+                self._encode_segments(groups, ranges, progress_bar)
+            else:
+                # One encoder per rendition for the whole reel
+                self.encoders = [self._start_encoder(self._encoder_command(self._output_file(rendition),
+                                                                           rendition=rendition))
+                                 for rendition in self.renditions]
+                frames = self._processed_frames(groups) if self.follow \
+                    else self._frames_for_range(groups, 0, len(groups))
+                try:
+                    self._encode_frames(self.encoders, frames, progress_bar)
+                finally:
+                    with self.metrics.time("encoder_flush"):
+                        for encoder in self.encoders:
+                            encoder.close()
+                for encoder, rendition in zip(self.encoders, self.renditions):
+                    if encoder.returncode != 0:
+                        raise RuntimeError(f"ffmpeg failed to encode {self._output_file(rendition)}")
+            completed = True
+        finally:
+            if not self.follow:
+                self._close_frame_cache(completed)
+            self.frames_written = progress_bar.n
+            progress_bar.close()
+            self._close_instrumentation()
 
         # Log completion
-        self.logger.info(f"Video {str(self.opath / self.name)}.{self.output_format} assembled successfully.")
+        for rendition in self.renditions:
+            self.logger.info(f"Video {self._output_file(rendition)} assembled successfully.")
+
+        if self.duplicate_tolerance > 0 and not from_cache:
+            self._report_duplicates()
+
+    def _report_duplicates(self) -> None:
+        runs: List[dict] = []
+        for index, name, shows in sorted(self.duplicates):
+            if runs and runs[-1]["last_index"] == index - 1 and runs[-1]["shows"] == shows:
+                runs[-1].update(last=name, last_index=index, frames=runs[-1]["frames"] + 1)
+            else:
+                runs.append({"first": name, "last": name, "first_index": index, "last_index": index,
+                             "frames": 1, "shows": shows})
+
+        self.logger.info(f"Reused the processed frame for {len(self.duplicates)} of {self.frames_written} frames "
+                         f"in {len(runs)} runs of duplicates")
+        for run in runs[:10]:
+            self.logger.info(f"  {run['first']} - {run['last']} ({run['frames']} frames) show {run['shows']}")
+        if len(runs) > 10:
+            self.logger.info(f"  ... and {len(runs) - 10} more runs")
+
+        report_file = self.opath / f"{self.name}.duplicates.json"
+        report = {
+            "tolerance": self.duplicate_tolerance,
+            "frames": self.frames_written,
+            "reused": len(self.duplicates),
+            "runs": runs,
+        }
+        try:
+            report_file.write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.logger.info(f"Duplicate frames listed in {str(report_file)}")
+        except OSError as e:
+            self.logger.warning(f"Could not write {str(report_file)} - {e}")
+
+    def _tone_map_for_preset(self, preset: str) -> cv2.Tonemap:
+        # Apply the preset on top of the command line settings, create its tone mapper and restore the settings
+        settings = self._tone_mapper_settings()
+        try:
+            self.tone_mapper_preset = preset
+            self._apply_tone_mapper_preset()
+            self._log_tone_mapper()
+            return self._create_tone_map()
+        finally:
+            for name, value in settings.items():
+                setattr(self, name, value)
+
+    def _sweep_groups(self) -> List[List[str]]:
+        groups = self._group_paths()
+        if self.sweep_range is not None:
+            return groups[slice(*self.sweep_range)]
+
+        count = min(self.sweep_frames, len(groups))
+        indices = np.linspace(0, len(groups) - 1, count).round().astype(int) if count > 0 else []
+        return [groups[i] for i in indices]
+
+    def _sweep_group(self, images: List[ndarray], tone_maps: List[cv2.Tonemap],
+                     thumbnail_size: Tuple[int, int] | None) -> List[ndarray]:
+        # Merge once, then tone map the shared HDR frame with every preset
+        hdr = self._merged_hdr(images)
+        frames = []
+        for tone_map in tone_maps:
+            with self.metrics.time("tone_map"):
+                ldr = tone_map.process(hdr)
+            frame = self._ldr_frame(ldr)
+            if thumbnail_size is not None:
+                frames.append(cv2.resize(frame, thumbnail_size, interpolation=cv2.INTER_AREA))
+            else:
+                frames.append(self._pipe_frame(frame))
+        return frames
+
+    def _write_contact_sheet(self, path: pathlib.Path, thumbnails: List[ndarray], columns: int = 4) -> None:
+        columns = min(columns, len(thumbnails))
+        rows = -(-len(thumbnails) // columns)
+        height, width = thumbnails[0].shape[:2]
+        sheet = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        for i, thumbnail in enumerate(thumbnails):
+            row, column = divmod(i, columns)
+            sheet[row * height:(row + 1) * height, column * width:(column + 1) * width] = thumbnail
+        if not cv2.imwrite(str(path), sheet):
+            raise OSError(f"Could not write contact sheet {str(path)}")
+
+    @_on_hdr_cpus
+    def sweep_tone_mappers(self) -> None:
+        """Writes one contact sheet of sampled frames (or one clip of a frame range) per tone mapper preset.
+
+        Every frame group is loaded and merged once; only tone mapping runs for each preset.
+        """
+        if not self.bracketing:
+            self.logger.error("--sweep compares the tone mappers of HDR frames and needs --bracketing")
+            return
+        if self.hdr_mode == "fusion":
+            self.logger.error("--sweep compares tone mappers, which exposure fusion does not use - use --hdr-mode debevec")
+            return
+
+        groups = self._sweep_groups()
+        if len(groups) == 0:
+            self.logger.error(f"No frames to sweep in {str(self.path)}")
+            return
+
+        presets = self.sweep_presets or list(TONE_MAPPER_PRESETS)
+        tone_maps = [self._tone_map_for_preset(preset) for preset in presets]
+
+        # Sampled frames are far apart and compared side by side; a frame range is played as a clip
+        thumbnail_size: Tuple[int, int] | None = None
+        encoders: List[FfmpegSink] = []
+        if self.sweep_range is None:
+            thumbnail_width = min(480, self.width)
+            thumbnail_size = (thumbnail_width, max(1, round(self.height * thumbnail_width / self.width)))
+            thumbnails: List[List[ndarray]] = [[] for _ in presets]
+        else:
+            encoders = [self._start_encoder(self._encoder_command(
+                str(self.opath / f"{self.name}.sweep-{preset}.{self.output_format}"))) for preset in presets]
+
+        self.logger.info(f"Sweeping {len(groups)} frames through {len(presets)} tone mapper presets: {', '.join(presets)}")
+
+        progress_bar = self._progress_bar(len(groups), "Sweep progress")
+        self._start_instrumentation()
+
+        pipeline = FramePipeline(load=self._budgeted(self._profiled(self._load_group)),
+                                 process=self._budgeted(self._profiled(
+                                     lambda images: self._sweep_group(images, tone_maps, thumbnail_size))),
+                                 num_loaders=self.num_workers,
+                                 num_workers=self.num_workers,
+                                 depth=self._pipeline_depth())
+        try:
+            with self.metrics.gauge(pipeline.queue_depths):
+                for frames in pipeline.run(self._read_ahead_groups(groups)):
+                    for k, frame in enumerate(frames):
+                        if encoders:
+                            self._write_frame(encoders[k], frame)
+                        else:
+                            thumbnails[k].append(frame)
+                    self.metrics.count_frame()
+                    progress_bar.update(1)
+        finally:
+            for encoder in encoders:
+                encoder.close()
+            self.frames_written = progress_bar.n
+            self._close_instrumentation()
+
+        progress_bar.close()
+
+        for k, preset in enumerate(presets):
+            if encoders:
+                output = self.opath / f"{self.name}.sweep-{preset}.{self.output_format}"
+                if encoders[k].returncode != 0:
+                    raise RuntimeError(f"ffmpeg failed to encode {str(output)}")
+            else:
+                output = self.opath / f"{self.name}.sweep-{preset}.png"
+                self._write_contact_sheet(output, thumbnails[k])
+            self.logger.info(f"Preset {preset} written to {str(output)}")
+
+
+_worker_generator: GenerateVideo | None = None
+_worker_memory: shared_memory.SharedMemory | None = None
+_worker_frame_bytes: int = 0
+_worker_process_group: Callable[[List[str]], ndarray] | None = None
+
+
+def _initialize_worker_process(generator: GenerateVideo, memory_name: str, frame_bytes: int) -> None:
+    global _worker_generator, _worker_memory, _worker_frame_bytes, _worker_process_group
+
+    # One frame per process - keep OpenCV from starting its own thread pool in every worker
+    cv2.setNumThreads(1)
+
+    _worker_generator = generator
+    _worker_frame_bytes = frame_bytes
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+
+    def process_group(paths: List[str]) -> ndarray:
+        return generator._process_group(generator._load_group(paths))
+
+    _worker_process_group = process_group
+    if generator.profile_file is not None:
+        # Every worker process writes its own statistics when it exits
+        profiler = ThreadProfiler()
+        _worker_process_group = profiler.wrap(process_group)
+        profile_file = generator.profile_file
+        atexit.register(profiler.dump, profile_file.with_name(f"{profile_file.stem}-{os.getpid()}{profile_file.suffix}"),
+                        generator.logger)
+
+
+def _process_group_into_slot(paths: List[str], slot: int) -> Tuple[int, Tuple[int, ...], int, List[Record]]:
+    frame = _worker_process_group(paths)
+    if frame.nbytes > _worker_frame_bytes:
+        raise ValueError(f"Frame {paths[0]} with shape {frame.shape} does not fit into {_worker_frame_bytes} bytes")
+
+    target = np.ndarray(frame.shape, dtype=np.uint8, buffer=_worker_memory.buf, offset=slot * _worker_frame_bytes)
+    np.copyto(target, frame)
+    del target
+
+    return slot, frame.shape, os.getpid(), _worker_generator.metrics.drain_records()
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+# Size of the thumbnail of every exposure a fingerprint is made of
+FINGERPRINT_SIZE = (64, 48)
+
+
+def fingerprint(images: List[ndarray]) -> ndarray:
+    """Thumbnails of all exposures of a frame group - every pixel averages a block of the frame, so noise cancels out."""
+    return np.stack([cv2.resize(image, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA) for image in images]) \
+        .astype(np.int16)
+
+
+class DuplicateDetector:
+    """Finds frame groups that look the same as the frame shown before them.
+
+    A group is a duplicate if no pixel of its fingerprint differs by more than ``tolerance`` from
+    the fingerprint of the group whose processed frame the previous group shows - so a slow fade
+    cannot creep through a long run of duplicates. Groups are decided in order of their index, but
+    may be loaded in any order and from several threads; every index from ``start`` on must be
+    decided exactly once, with ``decide`` or ``skip``.
+    """
+
+    def __init__(self, tolerance: float, start: int = 0) -> None:
+        self.tolerance = tolerance
+        self.start = start
+        # index, file name, file name of the frame it shows instead
+        self.duplicates: List[Tuple[int, str, str]] = []
+        self._anchors: Dict[int, Tuple[ndarray, str] | None] = {}
+        self._condition = threading.Condition()
+
+    def _wait_for_previous(self, index: int) -> Tuple[ndarray, str] | None:
+        while index > self.start and index - 1 not in self._anchors:
+            self._condition.wait()
+        return self._anchors.pop(index - 1, None)
+
+    def decide(self, index: int, name: str, images: List[ndarray]) -> bool:
+        current = fingerprint(images)
+        with self._condition:
+            anchor = self._wait_for_previous(index)
+            duplicate = anchor is not None and int(np.abs(current - anchor[0]).max()) <= self.tolerance
+            if duplicate:
+                self._anchors[index] = anchor
+                self.duplicates.append((index, name, anchor[1]))
+            else:
+                self._anchors[index] = (current, name)
+            self._condition.notify_all()
+        return duplicate
+
+    def skip(self, index: int) -> None:
+        """Decides that ``index`` could not be loaded - the group after it is processed in any case."""
+        with self._condition:
+            self._anchors[index] = None
+            self._condition.notify_all()
@@ -0,0 +1,67 @@
+import json
+import os
+import pathlib
+import threading
+from typing import Any, Dict, List
+
+JOURNAL_VERSION = 2
+
+
+class EncodeJournal:
+    """JSON record of the frame ranges that are already encoded into committed part files.
+
+    A journal only applies to the run it was written for: the fingerprint covers the input files
+    and all settings that influence the encoded frames, and a journal with a different
+    fingerprint is ignored.
+    """
+
+    def __init__(self, path: pathlib.Path, fingerprint: str, parameters: Dict[str, Any]) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self.parameters = parameters
+        self.completed: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != JOURNAL_VERSION or data.get("fingerprint") != self.fingerprint:
+            return False
+
+        # Only ranges whose part files still exist count as done
+        self.completed = {
+            index: entry for index, entry in data.get("completed", {}).items()
+            if all((self.path.parent / name).is_file() for name in entry["files"])
+        }
+        return True
+
+    def start(self) -> None:
+        with self._lock:
+            self.completed = {}
+            self._save()
+
+    def is_completed(self, index: int) -> bool:
+        return str(index) in self.completed
+
+    def commit(self, index: int, start: int, end: int, part_files: List[pathlib.Path]) -> None:
+        with self._lock:
+            self.completed[str(index)] = {"start": start, "end": end, "files": [f.name for f in part_files]}
+            self._save()
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def _save(self) -> None:
+        data = {
+            "version": JOURNAL_VERSION,
+            "fingerprint": self.fingerprint,
+            "parameters": self.parameters,
+            "completed": self.completed,
+        }
+        # Write to a temporary file first, so an interrupted write never leaves a broken journal behind
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,64 @@
+import queue
+import threading
+from typing import Callable, Dict, List
+
+from numpy import ndarray
+
+from frameStream import FrameSink
+
+_DONE = object()
+
+
+class EncoderFanOut:
+    """Sends every frame to several encoders, each fed by its own writer thread.
+
+    Each encoder has a queue of at most ``depth`` frames. A slow encoder lets the faster ones run
+    ahead by that many frames; once its queue is full, ``write`` blocks, so the slowest encoder
+    sets the pace and memory stays bounded. Frames are shared between the queues, not copied, and
+    must not be modified after they were written.
+    """
+
+    def __init__(self, encoders: List[FrameSink], write: Callable[[FrameSink, ndarray], None],
+                 depth: int = 8) -> None:
+        self._write = write
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=max(1, depth)) for _ in encoders]
+        self._error: BaseException | None = None
+        self._threads = [threading.Thread(target=self._feed, args=(encoder, q), daemon=True)
+                         for encoder, q in zip(encoders, self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def _feed(self, encoder: FrameSink, frames: queue.Queue) -> None:
+        failed = False
+        while True:
+            frame = frames.get()
+            if frame is _DONE:
+                return
+            if failed:
+                # Keep draining, so write never blocks on an encoder that is gone
+                continue
+            try:
+                self._write(encoder, frame)
+            except BaseException as e:
+                failed = True
+                if self._error is None:
+                    self._error = e
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Frames waiting for the slowest encoder."""
+        return {"encoder": max(frames.qsize() for frames in self._queues)}
+
+    def write(self, frame: ndarray) -> None:
+        if self._error is not None:
+            raise self._error
+        for frames in self._queues:
+            frames.put(frame)
+
+    def close(self) -> None:
+        """Waits until every encoder got all frames; raises the first write error."""
+        for frames in self._queues:
+            frames.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
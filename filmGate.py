@@ -0,0 +1,96 @@
+from typing import List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+from numpy import ndarray
+
+
+class Gate(NamedTuple):
+    """Columns and rows outside the film gate, in pixels of the unflipped frame at full size."""
+    left: int
+    top: int
+    right: int
+    bottom: int
+    width: int
+    height: int
+
+    def flipped(self, flip: int) -> "Gate":
+        # cv2.flip codes: 0 around the x axis, 1 around the y axis, -1 around both, 2 no flip
+        left, top, right, bottom = self.left, self.top, self.right, self.bottom
+        if flip in (1, -1):
+            left, right = right, left
+        if flip in (0, -1):
+            top, bottom = bottom, top
+        return Gate(left, top, right, bottom, self.width, self.height)
+
+    def scaled(self, proxy: int) -> "Gate":
+        """The gate in frames decoded at 1/proxy size, shrunk to an even width and height."""
+        width, height = self.width // proxy, self.height // proxy
+        left, top = -(-self.left // proxy), -(-self.top // proxy)
+        right, bottom = -(-self.right // proxy), -(-self.bottom // proxy)
+        right += (width - left - right) % 2
+        bottom += (height - top - bottom) % 2
+        return Gate(left, top, right, bottom, width, height)
+
+
+def _gate_edges(profile: ndarray) -> Tuple[int, int] | None:
+    # The picture is the run of bright columns (or rows) around the center, between dark mask on both sides
+    n = len(profile)
+    black = float(np.percentile(profile, 2))
+    picture = float(np.median(profile[n // 4: 3 * n // 4]))
+    if picture < 32:
+        # Too dark to tell the picture from the mask
+        return None
+    if picture - black < 16:
+        # The picture fills the frame in this direction
+        return 0, 0
+
+    inside = profile > black + 0.5 * (picture - black)
+    center = n // 2
+    if not inside[center]:
+        return None
+    first = center
+    while first > 0 and inside[first - 1]:
+        first -= 1
+    last = center
+    while last < n - 1 and inside[last + 1]:
+        last += 1
+    return first, n - 1 - last
+
+
+def detect_gate(groups: List[List[str]], size: Tuple[int, int], margin: float = 0.01) -> Gate | None:
+    """Finds the film gate in the brightest exposure of the sampled frame groups.
+
+    Every pixel takes its brightest value over all exposures and samples, so dark scenes and
+    underexposed brackets do not hide the picture area. The gate is shrunk by ``margin`` of the frame
+    size on every masked side to stay clear of its soft edges. Returns None if there is no clear edge.
+    """
+    brightest: ndarray | None = None
+    for paths in groups:
+        for path in paths:
+            # A quarter of the size is enough to find the edges to within a few pixels, and decodes faster
+            image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+            if image is None:
+                continue
+            brightest = image if brightest is None else np.maximum(brightest, image)
+    if brightest is None:
+        return None
+
+    columns = _gate_edges(brightest.mean(axis=0))
+    rows = _gate_edges(brightest.mean(axis=1))
+    if columns is None or rows is None:
+        return None
+
+    width, height = size
+    scale_x, scale_y = width / brightest.shape[1], height / brightest.shape[0]
+    # Sides without a mask stay uncropped
+    left, right = (int(np.ceil(edge * scale_x)) + int(margin * width) if edge else 0 for edge in columns)
+    top, bottom = (int(np.ceil(edge * scale_y)) + int(margin * height) if edge else 0 for edge in rows)
+    # An even width and height for yuv420p
+    right += (width - left - right) % 2
+    bottom += (height - top - bottom) % 2
+
+    # A gate of less than a quarter of the frame is more likely a dark scene than the picture area
+    if (width - left - right) * (height - top - bottom) < 0.25 * width * height:
+        return None
+    return Gate(left, top, right, bottom, width, height)
@@ -0,0 +1,119 @@
+import logging
+import os
+import pathlib
+import struct
+import threading
+from typing import Tuple
+
+import numpy as np
+from numpy import ndarray
+
+MAGIC = b"BVMFRAME"
+VERSION = 1
+# magic, version, complete, frame count, frame bytes, number of dimensions, shape (up to 3), key
+HEADER = struct.Struct("<8sIIQQI3I64s")
+# Frame data starts on a page boundary
+HEADER_SIZE = 4096
+
+
+class FrameCacheWriter:
+    """Writes processed frames into a preallocated cache file, in any order and from several threads."""
+
+    def __init__(self, path: pathlib.Path, key: str, count: int, shape: Tuple[int, ...]) -> None:
+        self.path = path
+        self.key = key
+        self.count = count
+        self.shape = shape
+        self.frame_bytes = int(np.prod(shape))
+        self.written = 0
+        self._lock = threading.Lock()
+
+        with open(path, "wb") as f:
+            f.write(_header(key, count, shape, complete=False))
+            f.truncate(HEADER_SIZE + count * self.frame_bytes)
+        self.frames = np.memmap(path, dtype=np.uint8, mode="r+", offset=HEADER_SIZE, shape=(count,) + shape)
+
+    def write(self, index: int, frame: ndarray) -> None:
+        # A frame of another size leaves the store incomplete, so it is discarded on commit
+        if frame.shape != self.shape:
+            return
+        self.frames[index] = frame
+        with self._lock:
+            self.written += 1
+
+    def commit(self) -> bool:
+        self.frames.flush()
+        del self.frames
+        if self.written != self.count:
+            self.path.unlink(missing_ok=True)
+            return False
+        with open(self.path, "r+b") as f:
+            f.write(_header(self.key, self.count, self.shape, complete=True))
+        return True
+
+    def discard(self) -> None:
+        if hasattr(self, "frames"):
+            del self.frames
+        self.path.unlink(missing_ok=True)
+
+
+class FrameCache:
+    """Directory of memory-mapped stores of processed frames.
+
+    A store holds every processed frame of one reel for one set of processing settings, identified
+    by a key computed from the input files and those settings. Encoding the reel again with other
+    encoder settings streams the frames straight from the store. Least recently used stores are
+    removed once the directory grows beyond ``limit_bytes``.
+    """
+
+    def __init__(self, directory: pathlib.Path, limit_bytes: int, logger: logging.Logger) -> None:
+        self.directory = directory
+        self.limit_bytes = limit_bytes
+        self.logger = logger
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.frames"
+
+    def open(self, key: str, count: int, shape: Tuple[int, ...]) -> np.memmap | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+
+        magic, version, complete, stored_count, frame_bytes, ndim, d0, d1, d2, stored_key = header
+        stored_shape = (d0, d1, d2)[:ndim]
+        if magic != MAGIC or version != VERSION or not complete or stored_key.rstrip(b"\0").decode() != key \
+                or stored_count != count or stored_shape != tuple(shape):
+            return None
+
+        # Mark the store as recently used for eviction
+        os.utime(path)
+        return np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(count,) + stored_shape)
+
+    def create(self, key: str, count: int, shape: Tuple[int, ...]) -> FrameCacheWriter | None:
+        size = HEADER_SIZE + count * int(np.prod(shape))
+        if size > self.limit_bytes:
+            self.logger.warning(f"Processed frames need {size / 2 ** 20:.0f} MB - more than the frame cache limit")
+            return None
+        self.evict(self.limit_bytes - size)
+        return FrameCacheWriter(self._path(key), key, count, shape)
+
+    def evict(self, limit_bytes: int | None = None) -> None:
+        limit_bytes = self.limit_bytes if limit_bytes is None else limit_bytes
+        stores = sorted(self.directory.glob("*.frames"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in stores)
+        for path in stores:
+            if total <= limit_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            self.logger.info(f"Removed {path.name} from the frame cache")
+
+
+def _header(key: str, count: int, shape: Tuple[int, ...], complete: bool) -> bytes:
+    dims = tuple(shape) + (0,) * (3 - len(shape))
+    return HEADER.pack(MAGIC, VERSION, int(complete), count, int(np.prod(shape)), len(shape), *dims,
+                       key.encode()).ljust(HEADER_SIZE, b"\0")
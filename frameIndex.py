@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import pathlib
+import re
+import struct
+from typing import Dict, List, Tuple
+
+MANIFEST_NAME = "beck-view-movie.manifest.json"
+MANIFEST_VERSION = 2
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def frame_pattern(bracketing: bool) -> re.Pattern:
+    return re.compile(r"^(\D*)(\d{5})([a-c])$") if bracketing else re.compile(r"^(\D*)(\d{5})(a)$")
+
+
+def png_size(path: str) -> Tuple[int, int] | None:
+    """Reads width and height from the IHDR chunk of a PNG file without decoding the image."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+class FrameIndex:
+    """Frame files of an input directory, sorted by frame number and exposure.
+
+    Built in a single os.scandir pass, which parses frame number and exposure of every file name
+    once, and cached in a manifest in the input directory. The manifest is reused as long as the
+    modification time of the directory is unchanged, i.e. no file was added, removed or renamed.
+    Rewriting a file in place keeps the modification time of the directory, so the index holds no
+    sizes or modification times - the fingerprints of the journal and the frame cache stat the files
+    themselves, and only when they are used.
+    """
+
+    def __init__(self, path: pathlib.Path, bracketing: bool,
+                 entries: List[Tuple[int, str, str]]) -> None:
+        self.path = path
+        self.bracketing = bracketing
+        # (frame number, exposure, file name) sorted by frame number and exposure
+        self.entries = entries
+
+        exposures = "abc" if bracketing else "a"
+        frames: Dict[int, List[Tuple[str, str]]] = {}
+        for frame, exposure, name in entries:
+            frames.setdefault(frame, []).append((exposure, name))
+
+        self.incomplete: List[int] = [frame for frame, files in frames.items() if len(files) != len(exposures)]
+        complete = [frame for frame in frames if len(frames[frame]) == len(exposures)]
+        self.frames: List[int] = complete
+
+        present = set(frames)
+        self.gaps: List[int] = [frame for frame in range(min(present), max(present) + 1)
+                                if frame not in present] if present else []
+
+        directory = os.path.abspath(path)
+        self.image_files: List[str] = [os.path.join(directory, name)
+                                       for frame in complete for _, name in frames[frame]]
+
+    @classmethod
+    def scan(cls, path: pathlib.Path, bracketing: bool) -> "FrameIndex":
+        pattern = frame_pattern(bracketing)
+        entries: List[Tuple[int, str, str]] = []
+        with os.scandir(path) as it:
+            for entry in it:
+                match = pattern.match(os.path.splitext(entry.name)[0])
+                if match and entry.is_file():
+                    entries.append((int(match.group(2)), match.group(3), entry.name))
+        entries.sort()
+        return cls(path, bracketing, entries)
+
+    @classmethod
+    def load(cls, path: pathlib.Path, bracketing: bool) -> "FrameIndex | None":
+        manifest = path / MANIFEST_NAME
+        try:
+            data = json.loads(manifest.read_text(encoding="utf-8"))
+            directory_mtime = os.stat(path).st_mtime_ns
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION or data.get("bracketing") != bracketing \
+                or data.get("directory_mtime_ns") != directory_mtime:
+            return None
+        return cls(path, bracketing, [tuple(entry) for entry in data["entries"]])
+
+    def save(self) -> None:
+        manifest = self.path / MANIFEST_NAME
+        # Creating the manifest changes the modification time of the directory; create it first and
+        # record the directory's modification time afterwards - rewriting an existing file does not change it
+        manifest.touch()
+        data = {
+            "version": MANIFEST_VERSION,
+            "bracketing": self.bracketing,
+            "directory_mtime_ns": os.stat(self.path).st_mtime_ns,
+            "entries": self.entries,
+        }
+        manifest.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+    def refresh(self) -> None:
+        """Records the current directory state after writing a sidecar file next to the frames.
+
+        The directory is scanned again, so files added since this index was built are not hidden from later runs.
+        """
+        try:
+            FrameIndex.scan(self.path, self.bracketing).save()
+        except OSError:
+            pass
+
+    def report(self, logger: logging.Logger) -> None:
+        if self.gaps:
+            logger.warning(f"{len(self.gaps)} frame numbers missing: {_abbreviate(self.gaps)}")
+        if self.incomplete:
+            logger.warning(f"{len(self.incomplete)} frames without a complete exposure group are skipped: "
+                           f"{_abbreviate(self.incomplete)}")
+
+
+def index_frames(path: pathlib.Path, bracketing: bool, logger: logging.Logger) -> FrameIndex:
+    index = FrameIndex.load(path, bracketing)
+    if index is not None:
+        logger.info(f"Using frame manifest {str(path / MANIFEST_NAME)}")
+        return index
+
+    index = FrameIndex.scan(path, bracketing)
+    try:
+        index.save()
+    except OSError as e:
+        logger.warning(f"Could not write frame manifest to {str(path)} - {e}")
+    return index
+
+
+def _abbreviate(frames: List[int], limit: int = 10) -> str:
+    text = ", ".join(str(frame) for frame in frames[:limit])
+    return text + ", ..." if len(frames) > limit else text
@@ -0,0 +1,169 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+
+class _Failure:
+    """Carries an exception raised in a pipeline stage to the consuming thread."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_LOADER_DONE = object()
+_WORKER_DONE = object()
+
+
+class FramePipeline:
+    """Streaming load -> process pipeline with bounded queues and in-order reassembly.
+
+    Loader threads and worker threads live for the whole run. At most ``depth`` items
+    are in flight (loaded, queued, processed or waiting for reassembly) at any time,
+    so peak memory is capped by ``depth`` instead of by the number of input items.
+    """
+
+    def __init__(self,
+                 load: Callable[[Any], Any],
+                 process: Callable[[Any], Any],
+                 num_loaders: int,
+                 num_workers: int,
+                 depth: int) -> None:
+        self.load = load
+        self.process = process
+        self.num_loaders = max(1, num_loaders)
+        self.num_workers = max(1, num_workers)
+        self.depth = max(1, depth)
+        self._loaded: queue.Queue = queue.Queue()
+        self._processed: queue.Queue = queue.Queue()
+        self._pending: Dict[int, Any] = {}
+        self._slots = threading.Semaphore(self.depth)
+        self._withheld = 0
+        self._resize_lock = threading.Lock()
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Loaded items waiting for a worker and processed items waiting to be yielded in order."""
+        return {"loaded": self._loaded.qsize(), "processed": self._processed.qsize() + len(self._pending)}
+
+    def resize(self, depth: int) -> None:
+        """Changes the number of items in flight of a running pipeline."""
+        depth = max(1, depth)
+        with self._resize_lock:
+            change = depth - self.depth
+            self.depth = depth
+            if change < 0:
+                # Slots in use are withheld when they come back, until the pipeline has shrunk
+                self._withheld -= change
+                return
+            released = min(change, self._withheld)
+            self._withheld -= released
+            for _ in range(change - released):
+                self._slots.release()
+
+    def _release_slot(self) -> None:
+        with self._resize_lock:
+            if self._withheld > 0:
+                self._withheld -= 1
+                return
+        self._slots.release()
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        source: Iterator[Tuple[int, Any]] = iter(enumerate(items))
+        source_lock = threading.Lock()
+        slots = self._slots = threading.Semaphore(self.depth)
+        self._withheld = 0
+        stop = threading.Event()
+
+        loaded: queue.Queue = queue.Queue(maxsize=self.depth)
+        processed: queue.Queue = queue.Queue()
+        pending: Dict[int, Any] = {}
+        self._loaded, self._processed, self._pending = loaded, processed, pending
+
+        def next_item():
+            with source_lock:
+                return next(source, None)
+
+        def put(q: queue.Queue, value) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def loader() -> None:
+            try:
+                while not stop.is_set():
+                    while not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    entry = next_item()
+                    if entry is None:
+                        self._release_slot()
+                        return
+                    index, item = entry
+                    if not put(loaded, (index, self.load(item))):
+                        return
+            except BaseException as e:
+                processed.put(_Failure(e))
+            finally:
+                processed.put(_LOADER_DONE)
+
+        def worker() -> None:
+            try:
+                while not stop.is_set():
+                    try:
+                        entry = loaded.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if entry is _LOADER_DONE:
+                        return
+                    index, data = entry
+                    processed.put((index, self.process(data)))
+            except BaseException as e:
+                processed.put(_Failure(e))
+            finally:
+                processed.put(_WORKER_DONE)
+
+        loaders: List[threading.Thread] = [
+            threading.Thread(target=loader, name=f"frame-loader-{i}", daemon=True) for i in range(self.num_loaders)
+        ]
+        workers: List[threading.Thread] = [
+            threading.Thread(target=worker, name=f"frame-worker-{i}", daemon=True) for i in range(self.num_workers)
+        ]
+        for t in loaders + workers:
+            t.start()
+
+        next_index = 0
+        loaders_running = self.num_loaders
+        workers_running = self.num_workers
+
+        try:
+            while True:
+                while next_index in pending:
+                    result = pending.pop(next_index)
+                    next_index += 1
+                    self._release_slot()
+                    yield result
+
+                if workers_running == 0:
+                    break
+
+                entry = processed.get()
+                if entry is _LOADER_DONE:
+                    loaders_running -= 1
+                    if loaders_running == 0:
+                        for _ in workers:
+                            put(loaded, _LOADER_DONE)
+                    continue
+                if entry is _WORKER_DONE:
+                    workers_running -= 1
+                    continue
+                if isinstance(entry, _Failure):
+                    raise entry.error
+                index, result = entry
+                pending[index] = result
+        finally:
+            stop.set()
+            for t in loaders + workers:
+                t.join()
@@ -0,0 +1,183 @@
+import logging
+import os
+import pathlib
+import subprocess
+import threading
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from frameIndex import FrameIndex, index_frames, png_size
+from frameWatcher import FrameDirectoryWatcher
+from resourceTuner import child_affinity
+
+# An image of a frame group - the path of an image file or a decoded BGR image
+Image = str | ndarray
+
+
+def image_size(image: Image) -> Tuple[int, int] | None:
+    """Width and height of an image - read from the PNG header of an image file."""
+    if isinstance(image, ndarray):
+        return image.shape[1], image.shape[0]
+    return png_size(image)
+
+
+def image_name(image: Image | os.PathLike, index: int) -> str:
+    return f"frame {index}" if isinstance(image, ndarray) else os.path.basename(image)
+
+
+class FrameSource:
+    """Where the frame groups of a reel come from - one image per frame, or the three exposures of a bracketed frame.
+
+    ``open`` returns the images known up front, flat in frame order. A source that ``follows`` a
+    reel while it is written also hands out its frame groups one by one with ``groups``.
+    """
+    # Images are paths of image files (and can be read ahead, cached and detected by their name)
+    files = True
+    follows = False
+    frame_index: FrameIndex | None = None
+
+    def open(self, samples: int, logger: logging.Logger) -> List[Image]:
+        raise NotImplementedError
+
+    def groups(self) -> Iterator[List[Image]]:
+        raise NotImplementedError
+
+
+class DirectorySource(FrameSource):
+    """The frames*.png files of a directory, indexed once and cached in the frame manifest."""
+
+    def __init__(self, path: pathlib.Path, bracketing: bool) -> None:
+        self.path = path
+        self.bracketing = bracketing
+
+    def open(self, samples: int, logger: logging.Logger) -> List[Image]:
+        self.frame_index = index_frames(self.path, self.bracketing, logger)
+        self.frame_index.report(logger)
+        return self.frame_index.image_files
+
+
+class WatchSource(FrameSource):
+    """The frames of a directory beck-view-digitalize is still writing to, handed out as they arrive."""
+    follows = True
+
+    def __init__(self, path: pathlib.Path, bracketing: bool, sentinel: str, idle_timeout: float) -> None:
+        self.path = path
+        self.bracketing = bracketing
+        self.sentinel = sentinel
+        self.idle_timeout = idle_timeout
+        self.watcher: FrameDirectoryWatcher | None = None
+
+    def open(self, samples: int, logger: logging.Logger) -> List[Image]:
+        self.watcher = FrameDirectoryWatcher(self.path, self.bracketing, self.sentinel, self.idle_timeout, logger)
+        logger.info(f"Following {str(self.path)} until {self.sentinel} appears "
+                    f"or no frames arrive for {self.idle_timeout:.0f} s")
+        return self.watcher.wait_for_groups(samples)
+
+    def groups(self) -> Iterator[List[Image]]:
+        return self.watcher.groups()
+
+
+class ArraySource(FrameSource):
+    """Decoded 8-bit BGR images in memory, e.g. from a capture service - all exposures of a frame in a row."""
+    files = False
+
+    def __init__(self, images: Sequence[ndarray]) -> None:
+        self.images = images
+
+    def open(self, samples: int, logger: logging.Logger) -> List[Image]:
+        return list(self.images)
+
+
+class FrameSink:
+    """Receives the processed frames of a reel in order - in the pipe format, ``bgr24`` or ``yuv420p``."""
+    returncode: int | None = 0
+
+    def write(self, frame: ndarray) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "FrameSink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class FfmpegSink(FrameSink):
+    """Pipes the frames into an ffmpeg process; its messages go to ``logger``."""
+
+    def __init__(self, cmd: List[str], logger: logging.Logger, cpus: List[int] | None = None) -> None:
+        self.logger = logger
+        # The encoder runs on cpus, if given - it inherits the mask of the thread starting it
+        with child_affinity(cpus):
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        threading.Thread(target=self._log_stderr, daemon=True).start()
+
+    def _log_stderr(self) -> None:
+        for line in self.process.stderr:
+            line = line.decode(errors="replace").strip()
+            if not line:
+                continue
+
+            # Classify severity
+            if "error" in line.lower():
+                self.logger.error(f"[ffmpeg] {line}")
+            elif "warning" in line.lower():
+                self.logger.warning(f"[ffmpeg] {line}")
+            else:
+                self.logger.info(f"[ffmpeg] {line}")
+
+    @property
+    def returncode(self) -> int | None:
+        return self.process.returncode
+
+    def write(self, frame: ndarray) -> None:
+        # Hand the frame buffer to the pipe as it is - large writes bypass the pipe's buffer, so nothing is copied
+        self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+
+    def close(self) -> None:
+        """Closes the pipe and waits until ffmpeg has written the video."""
+        if not self.process.stdin.closed:
+            self.process.stdin.close()
+        self.process.wait()
+
+
+class NullSink(FrameSink):
+    """Drops the frames - measures the throughput of decoding and processing without an encoder."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, frame: ndarray) -> None:
+        self.frames += 1
+        self.bytes += frame.nbytes
+
+
+class RawFileSink(FrameSink):
+    """Writes the frames one after the other into a file without any header, e.g. for ffmpeg -f rawvideo."""
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._file = open(path, "wb")
+
+    def write(self, frame: ndarray) -> None:
+        self._file.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CallbackSink(FrameSink):
+    """Calls ``callback`` with every frame. The frame may be a view of a buffer that is reused - copy it to keep it."""
+
+    def __init__(self, callback: Callable[[ndarray], None]) -> None:
+        self.callback = callback
+
+    def write(self, frame: ndarray) -> None:
+        self.callback(frame)
+
@@ -0,0 +1,134 @@
+import logging
+import os
+import pathlib
+import time
+from typing import Dict, Iterator, List, Set
+
+from frameIndex import frame_pattern
+
+# Every complete PNG file ends with an empty IEND chunk
+PNG_TRAILER = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+
+def is_complete_png(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.seek(-len(PNG_TRAILER), os.SEEK_END)
+            return f.read() == PNG_TRAILER
+    except OSError:
+        # Too short (still being written) or removed in the meantime
+        return False
+
+
+class FrameDirectoryWatcher:
+    """Follows a directory that beck-view-digitalize is still writing frames to.
+
+    The directory is polled with os.scandir; inotify is not available on the Windows and macOS
+    stations, and a scan of one directory is cheap compared to processing a frame. Frame groups
+    are handed out in frame order as soon as they are contiguous and all their files are complete
+    PNGs. The stream ends when the sentinel file appears or no new frame arrived for
+    ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, path: pathlib.Path, bracketing: bool, sentinel: str, idle_timeout: float,
+                 logger: logging.Logger, poll_interval: float = 0.5) -> None:
+        self.path = path
+        self.bracketing = bracketing
+        self.sentinel = path / sentinel
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.logger = logger
+
+        self.pattern = frame_pattern(bracketing)
+        self.exposures = "abc" if bracketing else "a"
+
+        self._complete: Set[str] = set()
+        self._groups: Dict[int, List[str]] = {}
+        self._first_frame: int | None = None
+        self._next_frame: int | None = None
+        self._skipped: Set[int] = set()
+        self._last_change = time.monotonic()
+        self._finished = False
+
+    def _scan(self) -> None:
+        files: Dict[int, Dict[str, str]] = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                match = self.pattern.match(os.path.splitext(entry.name)[0])
+                if match and entry.is_file():
+                    files.setdefault(int(match.group(2)), {})[match.group(3)] = os.path.abspath(entry.path)
+
+        for frame, exposures in files.items():
+            if self._first_frame is not None and frame < self._first_frame and frame not in self._skipped:
+                self._skipped.add(frame)
+                self.logger.warning(f"Frame {frame} arrived after the stream started at frame {self._first_frame} - skipped")
+            if frame in self._groups or (self._next_frame is not None and frame < self._next_frame):
+                continue
+            if len(exposures) < len(self.exposures):
+                continue
+            paths = [exposures[e] for e in self.exposures]
+            # Half-written files are picked up again by a later scan
+            for p in paths:
+                if p not in self._complete and is_complete_png(p):
+                    self._complete.add(p)
+            if all(p in self._complete for p in paths):
+                self._groups[frame] = paths
+                self._complete.difference_update(paths)
+                self._last_change = time.monotonic()
+
+        if self._next_frame is None and self._groups:
+            # The lowest frame seen, complete or not - a frame still being written must not be skipped
+            self._first_frame = self._next_frame = min(files)
+
+    def _contiguous(self) -> Iterator[List[str]]:
+        while self._next_frame is not None and self._next_frame in self._groups:
+            yield self._groups.pop(self._next_frame)
+            self._next_frame += 1
+
+    def _is_finished(self) -> bool:
+        if self.sentinel.exists():
+            return True
+        if time.monotonic() - self._last_change > self.idle_timeout:
+            self.logger.warning(f"No new frames for {self.idle_timeout:.0f} s - finishing")
+            return True
+        return False
+
+    def wait_for_groups(self, count: int) -> List[str]:
+        """Waits until ``count`` frame groups are available (or the stream ended) and returns their files."""
+        while not self._finished:
+            self._scan()
+            if len(self._groups) >= count:
+                break
+            self._finished = self._is_finished()
+            if not self._finished:
+                time.sleep(self.poll_interval)
+
+        frames = sorted(self._groups)[:count]
+        return [p for frame in frames for p in self._groups[frame]]
+
+    def groups(self) -> Iterator[List[str]]:
+        while True:
+            self._scan()
+            handed_out = False
+            for group in self._contiguous():
+                handed_out = True
+                yield group
+
+            if handed_out:
+                # Only time spent waiting for new frames counts as idle
+                self._last_change = time.monotonic()
+                continue
+
+            if self._finished or self._is_finished():
+                # Final scan - frames written just before the sentinel are still included
+                self._scan()
+                yield from self._contiguous()
+                if self._groups:
+                    remaining = sorted(self._groups)
+                    missing = remaining[-1] - self._next_frame + 1 - len(remaining)
+                    self.logger.warning(f"{missing} frames missing between frame {self._next_frame} and {remaining[-1]}")
+                    for frame in remaining:
+                        yield self._groups.pop(frame)
+                return
+
+            time.sleep(self.poll_interval)
@@ -5,7 +5,6 @@ from multiprocessing import freeze_support
 from types import FrameType
 
 from CommandLineParser import CommandLineParser
-from createVideo import GenerateVideo
 
 
 def sigint_handler(signum: int, frame: FrameType | None) -> None:
@@ -20,11 +19,25 @@ signal.signal(signal.SIGINT, sigint_handler)
 def main():
     freeze_support()
 
-    args: Namespace = CommandLineParser().parse_args()
+    command_line_parser = CommandLineParser()
+    args: Namespace = command_line_parser.parse_args()
 
+    # OpenCV and NumPy take a while to import - --help, --version and argument errors return without them
+    if args.batch is not None:
+        from batchScheduler import BatchScheduler
+        sys.exit(0 if BatchScheduler(command_line_parser, args).run() else 1)
+
+    from createVideo import GenerateVideo
     generate_video: GenerateVideo = GenerateVideo(args)
 
-    generate_video.assemble_video()
+    if args.sweep is not None:
+        generate_video.sweep_tone_mappers()
+    elif args.sink == "ffmpeg":
+        generate_video.assemble_video()
+    else:
+        from frameStream import NullSink, RawFileSink
+        generate_video.write_frames(NullSink() if args.sink == "null" else RawFileSink(
+            args.opath / f"{generate_video.name}.{generate_video.pipe_format}"))
 
 
 # Press the green button in the gutter to run the script.
@@ -0,0 +1,174 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from stageMetrics import StageMetrics
+
+
+class ImageBytes:
+    """Encoded bytes of one image file, read ahead of its decoding.
+
+    Stands in for the path of the file (``os.fspath``, ``str``), so names and error messages stay the
+    same. ``data`` is None if the file could not be read; ``release`` hands the buffer back for reuse.
+    """
+    __slots__ = ("path", "data", "_read_ahead", "_buffer")
+
+    def __init__(self, path: str, data: ndarray | None, read_ahead: "ReadAhead", buffer: bytearray | None) -> None:
+        self.path = path
+        self.data = data
+        self._read_ahead = read_ahead
+        self._buffer = buffer
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __str__(self) -> str:
+        return self.path
+
+    def release(self) -> None:
+        if self._read_ahead is not None:
+            self._read_ahead._release(self._buffer)
+            self._read_ahead = self._buffer = None
+            self.data = None
+
+
+class ReadAhead:
+    """Reads the image files of frame groups ahead of their decoding, in a few threads of its own.
+
+    At most ``window`` files are read and not yet released at any time - their bytes are kept in
+    buffers that are reused for later files, and the window must hold the files of one group. Frame
+    groups are yielded in order as soon as all their files are read, so the threads decoding them
+    no longer wait for the storage. Every file is opened with sequential and will-need hints
+    (``posix_fadvise``), so the kernel reads it ahead in large requests.
+    """
+
+    def __init__(self, window: int, num_threads: int, metrics: StageMetrics) -> None:
+        self.window = max(1, window)
+        self.num_threads = max(1, num_threads)
+        self.metrics = metrics
+        self._slots = threading.Semaphore(self.window)
+        self._lock = threading.Lock()
+        self._buffers: List[bytearray] = []
+        self._ready = 0
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Files read and waiting to be decoded."""
+        return {"read_ahead": self._ready}
+
+    def _buffer(self, size: int) -> bytearray:
+        with self._lock:
+            # The smallest free buffer the file fits into
+            fitting = [buffer for buffer in self._buffers if len(buffer) >= size]
+            if fitting:
+                buffer = min(fitting, key=len)
+                self._buffers.remove(buffer)
+                return buffer
+            if self._buffers:
+                # Drop a buffer that is too small instead of keeping one per size
+                self._buffers.pop()
+        # Some room, so frames that are slightly larger still fit
+        return bytearray(size + size // 8)
+
+    def _release(self, buffer: bytearray | None) -> None:
+        with self._lock:
+            if buffer is not None:
+                self._buffers.append(buffer)
+            self._ready -= 1
+        self._slots.release()
+
+    def _read(self, path: str) -> ImageBytes:
+        with self.metrics.time("read"):
+            try:
+                with open(path, "rb", buffering=0) as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if hasattr(os, "posix_fadvise"):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                        os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+                    buffer = self._buffer(size)
+                    view = memoryview(buffer)
+                    read = 0
+                    while read < size:
+                        count = f.readinto(view[read:size])
+                        if not count:
+                            break
+                        read += count
+                data = np.frombuffer(buffer, dtype=np.uint8, count=read)
+            except OSError:
+                # Decoding reports the file as failed to load
+                buffer, data = None, None
+        with self._lock:
+            self._ready += 1
+        return ImageBytes(path, data, self, buffer)
+
+    def groups(self, groups: Iterable[List[str]]) -> Iterator[List[ImageBytes]]:
+        """Yields the frame groups of ``groups`` with the bytes of their files.
+
+        Every yielded ``ImageBytes`` must be released. Files read for groups that were not taken when
+        the iterator is closed are released here.
+        """
+        reads: Deque[Tuple[int, Future]] = deque()
+        condition = threading.Condition()
+        stop = threading.Event()
+        done = False
+        failure: BaseException | None = None
+
+        def dispatch() -> None:
+            nonlocal done, failure
+            try:
+                for group in groups:
+                    for k, path in enumerate(group):
+                        while not self._slots.acquire(timeout=0.1):
+                            if stop.is_set():
+                                return
+                        with condition:
+                            if stop.is_set():
+                                self._slots.release()
+                                return
+                            # The number of files of the group still to come, this one included
+                            reads.append((len(group) - k, executor.submit(self._read, path)))
+                            condition.notify()
+            except BaseException as e:
+                failure = e
+            finally:
+                with condition:
+                    done = True
+                    condition.notify()
+
+        executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="frame-reader")
+        # Not joined - in follow mode the next group may not arrive for a while
+        threading.Thread(target=dispatch, name="read-ahead", daemon=True).start()
+        try:
+            with self.metrics.gauge(self.queue_depths):
+                while True:
+                    files: List[ImageBytes] = []
+                    complete = False
+                    while not complete:
+                        with condition:
+                            while not reads and not done:
+                                condition.wait()
+                            if not reads:
+                                break
+                            remaining, future = reads.popleft()
+                        files.append(future.result())
+                        complete = remaining == 1
+                    if not complete:
+                        # Only the dispatcher failing leaves a group incomplete
+                        for image in files:
+                            image.release()
+                        break
+                    yield files
+            if failure is not None:
+                raise failure
+        finally:
+            with condition:
+                stop.set()
+                pending = list(reads)
+                reads.clear()
+            executor.shutdown(wait=True)
+            for _, future in pending:
+                future.result().release()
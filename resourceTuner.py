@@ -0,0 +1,265 @@
+import ctypes
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, NamedTuple, Set
+
+from framePipeline import FramePipeline
+
+# Memory x264 keeps per encoder, in frames of the video - lookahead and reference frames in yuv420p
+ENCODER_FRAMES = 60
+# Margin on the measured working memory for buffers OpenCV allocates outside of NumPy
+WORKING_MEMORY_MARGIN = 1.25
+# Interpreter, NumPy and OpenCV of a worker process of the process executor
+WORKER_PROCESS_BYTES = 150 * 2 ** 20
+
+
+def usable_cpus() -> int:
+    """CPUs this process may run on - fewer than os.cpu_count() in a container or with an affinity mask."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+class CpuSplit(NamedTuple):
+    """CPUs of the HDR stage (loaders, workers, OpenCV) and of the encoders."""
+    hdr_cpus: List[int]
+    encoder_cpus: List[int]
+
+
+def split_cpus(hdr_share: float) -> CpuSplit | None:
+    """Splits the usable CPUs by ``hdr_share`` for the HDR stage, at least one on either side."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(usable_cpus()))
+    if len(cpus) < 2:
+        return None
+    hdr = min(len(cpus) - 1, max(1, round(hdr_share * len(cpus))))
+    return CpuSplit(cpus[:hdr], cpus[hdr:])
+
+
+def cpu_list(cpus: List[int]) -> str:
+    """CPU numbers in the notation of taskset and /proc, e.g. 0-5,8."""
+    ranges: List[List[int]] = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+@contextmanager
+def thread_affinity(cpus: List[int] | None) -> Iterator[bool]:
+    """Runs the calling thread on ``cpus`` in the block and restores its mask afterwards.
+
+    Threads and processes started in the block inherit the mask, the rest of the process keeps its own.
+    Yields False where the platform has no CPU affinity.
+    """
+    if cpus is None or not hasattr(os, "sched_setaffinity"):
+        yield False
+        return
+    previous: Set[int] = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield True
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+_affinity_lock = threading.Lock()
+
+
+@contextmanager
+def child_affinity(cpus: List[int] | None) -> Iterator[None]:
+    """Processes started in the block run on ``cpus`` - a child inherits the mask of the thread starting it."""
+    if cpus is None or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    with _affinity_lock:
+        previous: Set[int] = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, cpus)
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, previous)
+
+
+class _MemoryStatus(ctypes.Structure):
+    _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+
+def available_memory_bytes() -> int | None:
+    """Memory that can be used without swapping, or None if it cannot be determined."""
+    if sys.platform == "win32":
+        status = _MemoryStatus()
+        status.dwLength = ctypes.sizeof(_MemoryStatus)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def current_rss_bytes() -> int | None:
+    """Resident set size of this process, or None if it cannot be determined."""
+    if sys.platform == "win32":
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(_ProcessMemoryCounters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class FrameCost(NamedTuple):
+    """Cost of one frame group, measured on a few groups before the run."""
+    decode_seconds: float
+    process_seconds: float
+    group_bytes: int
+    frame_bytes: int
+    working_bytes: int
+
+
+class PipelinePlan(NamedTuple):
+    num_workers: int
+    depth: int
+
+
+def plan_pipeline(cost: FrameCost, cpus: int, budget_bytes: int | None, num_workers: int | None = None,
+                  depth: int | None = None) -> PipelinePlan:
+    """Sizes workers and frame groups in flight, so both fit into ``budget_bytes``.
+
+    ``num_workers`` or ``depth`` are kept if given, unless they do not fit into the budget. Every
+    worker needs the working memory of one frame, every group in flight its decoded images.
+    """
+    working = int(cost.working_bytes * WORKING_MEMORY_MARGIN)
+    in_flight = max(cost.group_bytes, cost.frame_bytes, 1)
+
+    workers = num_workers or cpus
+    if budget_bytes is not None:
+        # Every worker comes with at least one group in flight
+        workers = min(workers, max(1, budget_bytes // (working + in_flight)))
+
+    if depth is None:
+        # Loaders run ahead of the workers by the ratio of decode to processing time, plus one group per
+        # worker to smooth out uneven frames; more in flight does not make the pipeline faster
+        ratio = cost.decode_seconds / max(cost.process_seconds, 1e-3)
+        depth = workers * (2 + min(4, int(ratio + 0.5)))
+    if budget_bytes is not None:
+        depth = min(depth, max(workers, (budget_bytes - workers * working) // in_flight))
+    return PipelinePlan(workers, max(workers, depth))
+
+
+class PipelineTuner:
+    """Shrinks the running frame pipelines when memory runs short and grows them back later.
+
+    Every ``period`` seconds the throughput of the last period is compared to the best so far. When
+    the process uses more than its memory budget, or the machine runs out of available memory while
+    throughput drops - the first sign of swapping -, the pipelines keep a quarter fewer frame groups
+    in flight. Once memory is plentiful again they grow back one step at a time, up to the planned
+    depth.
+    """
+
+    def __init__(self, logger: logging.Logger, frames: Callable[[], int], budget_bytes: int | None,
+                 min_depth: int, period: float = 10.0) -> None:
+        self.logger = logger
+        self.frames = frames
+        self.budget_bytes = budget_bytes
+        self.min_depth = max(1, min_depth)
+        self.period = period
+        self._pipelines: List[FramePipeline] = []
+        self._planned: List[int] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def track(self, pipeline: FramePipeline) -> Iterator[None]:
+        """Adjusts the depth of ``pipeline`` while the block runs."""
+        with self._lock:
+            self._pipelines.append(pipeline)
+            self._planned.append(pipeline.depth)
+        try:
+            yield
+        finally:
+            with self._lock:
+                i = self._pipelines.index(pipeline)
+                del self._pipelines[i]
+                del self._planned[i]
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pipeline-tuner", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        best_fps = 0.0
+        frames = self.frames()
+        started = time.perf_counter()
+        while not self._stop.wait(self.period):
+            now = time.perf_counter()
+            fps = (self.frames() - frames) / (now - started)
+            frames, started = self.frames(), now
+            best_fps = max(best_fps, fps)
+
+            rss = current_rss_bytes()
+            available = available_memory_bytes()
+            over_budget = self.budget_bytes is not None and rss is not None and rss > self.budget_bytes
+            # Little memory left and throughput down - most likely swapping
+            swapping = available is not None and rss is not None and available < 0.05 * (available + rss) \
+                and fps < 0.8 * best_fps
+            plentiful = (self.budget_bytes is None or (rss is not None and rss < 0.8 * self.budget_bytes)) \
+                and (available is None or rss is None or available > 0.2 * (available + rss))
+
+            with self._lock:
+                for i, pipeline in enumerate(self._pipelines):
+                    if over_budget or swapping:
+                        depth = max(self.min_depth, pipeline.depth - max(1, pipeline.depth // 4))
+                    elif plentiful:
+                        depth = min(self._planned[i], pipeline.depth + 1)
+                    else:
+                        continue
+                    if depth != pipeline.depth:
+                        self.logger.info(f"{'Shrinking' if depth < pipeline.depth else 'Growing'} the pipeline to "
+                                         f"{depth} frame groups in flight - {fps:.2f} frames/s, "
+                                         f"{(rss or 0) / 2 ** 20:.0f} MB resident, "
+                                         f"{(available or 0) / 2 ** 20:.0f} MB available")
+                        pipeline.resize(depth)
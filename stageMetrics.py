@@ -0,0 +1,376 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pathlib
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# cProfile uses sys.monitoring from Python 3.12 on - one profiler per process, seeing all threads
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+# stage, start (time.perf_counter), seconds, thread id
+Record = Tuple[str, float, float, int]
+
+
+class _Stage:
+    __slots__ = ("calls", "seconds", "max_seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class _Gauge:
+    __slots__ = ("last", "peak", "total", "samples")
+
+    def __init__(self) -> None:
+        self.last = 0
+        self.peak = 0
+        self.total = 0
+        self.samples = 0
+
+
+class StageMetrics:
+    """Timers of the stages of one reel and gauges of the queues between them.
+
+    Every timed stage counts its calls, total and longest time. Queue depths are sampled once a
+    second from the registered gauges. While running, the metrics are logged every ``interval``
+    seconds and written to a Prometheus textfile; a Chrome trace of every timed call (open it in
+    chrome://tracing or https://ui.perfetto.dev) is written when closed.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 0.0, prometheus_file: pathlib.Path | None = None,
+                 trace_file: pathlib.Path | None = None, reel: str = "", keep_records: bool = False) -> None:
+        self.logger = logger
+        self.interval = max(0.0, interval)
+        self.prometheus_file = prometheus_file
+        self.trace_file = trace_file
+        self.reel = reel
+        self.keep_records = keep_records or trace_file is not None
+        self.origin = time.perf_counter()
+
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Stage] = {}
+        self._gauges: Dict[str, _Gauge] = {}
+        self._sources: List[Callable[[], Dict[str, int]]] = []
+        self._records: List[Tuple[int, Record]] = []
+        self._counters: List[Tuple[float, Dict[str, int]]] = []
+        self._thread_names: Dict[Tuple[int, int], str] = {}
+        self._frames = 0
+        self._stop = threading.Event()
+        self._reporter: threading.Thread | None = None
+
+    def record(self, stage: str, start: float, seconds: float, pid: int | None = None,
+               thread_id: int | None = None) -> None:
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = _Stage()
+            entry.calls += 1
+            entry.seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            if self.keep_records:
+                if thread_id is None:
+                    thread = threading.current_thread()
+                    thread_id = thread.ident
+                    self._thread_names.setdefault((os.getpid(), thread_id), thread.name)
+                self._records.append((pid or os.getpid(), (stage, start, seconds, thread_id)))
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.perf_counter() - start)
+
+    def timed_iterator(self, stage: str, items: Iterable) -> Iterator:
+        """Yields the items of ``items`` and times how long every one of them took to arrive."""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(stage, start, time.perf_counter() - start)
+            yield item
+
+    @property
+    def frames(self) -> int:
+        return self._frames
+
+    def count_frame(self) -> None:
+        with self._lock:
+            self._frames += 1
+
+    def drain_records(self) -> List[Record]:
+        """Returns and forgets the kept records - worker processes hand them to the main process."""
+        with self._lock:
+            records = [record for _, record in self._records]
+            self._records = []
+            self._stages = {}
+        return records
+
+    def merge(self, pid: int, records: List[Record]) -> None:
+        for stage, start, seconds, thread_id in records:
+            self.record(stage, start, seconds, pid, thread_id)
+
+    @contextmanager
+    def gauge(self, source: Callable[[], Dict[str, int]]) -> Iterator[None]:
+        """Samples the queue depths returned by ``source`` while the block runs."""
+        with self._lock:
+            self._sources.append(source)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sources.remove(source)
+
+    def _sample(self) -> None:
+        with self._lock:
+            sources = list(self._sources)
+        depths: Dict[str, int] = {}
+        for source in sources:
+            for name, value in source().items():
+                depths[name] = depths.get(name, 0) + value
+        with self._lock:
+            for name, value in depths.items():
+                gauge = self._gauges.get(name)
+                if gauge is None:
+                    gauge = self._gauges[name] = _Gauge()
+                gauge.last = value
+                gauge.peak = max(gauge.peak, value)
+                gauge.total += value
+                gauge.samples += 1
+            for name, gauge in self._gauges.items():
+                if name not in depths:
+                    gauge.last = 0
+            if self.keep_records and depths:
+                self._counters.append((time.perf_counter(), depths))
+
+    def start(self) -> None:
+        if self._reporter is not None:
+            return
+        self._stop.clear()
+        self._reporter = threading.Thread(target=self._report, name="stage-metrics", daemon=True)
+        self._reporter.start()
+
+    def _report(self) -> None:
+        # A Prometheus textfile collector reads the file every 15 s or so by default
+        period = self.interval or 15.0
+        next_report = time.perf_counter() + period
+        while not self._stop.wait(1.0):
+            self._sample()
+            if time.perf_counter() >= next_report:
+                next_report += period
+                if self.interval > 0:
+                    self.logger.info(self._log_line())
+                self._write_prometheus()
+
+    def _log_line(self) -> str:
+        # One line of key=value pairs, easy to grep and to parse
+        elapsed = time.perf_counter() - self.origin
+        with self._lock:
+            fields = [f"elapsed_s={elapsed:.1f}", f"frames={self._frames}",
+                      f"fps={self._frames / elapsed if elapsed > 0 else 0.0:.2f}"]
+            for name, stage in self._stages.items():
+                fields.append(f"{name}.calls={stage.calls}")
+                fields.append(f"{name}.avg_ms={1000.0 * stage.seconds / stage.calls:.1f}")
+                fields.append(f"{name}.busy={stage.seconds / elapsed if elapsed > 0 else 0.0:.2f}")
+            for name, gauge in self._gauges.items():
+                fields.append(f"queue.{name}={gauge.last}")
+        return "metrics " + " ".join(fields)
+
+    def _write_prometheus(self) -> None:
+        if self.prometheus_file is None:
+            return
+        reel = self.reel.replace("\\", "\\\\").replace('"', '\\"')
+        with self._lock:
+            lines = [
+                "# HELP beck_view_frames_total Frames handed to the encoders.",
+                "# TYPE beck_view_frames_total counter",
+                f'beck_view_frames_total{{reel="{reel}"}} {self._frames}',
+                "# HELP beck_view_elapsed_seconds Time since the reel was opened.",
+                "# TYPE beck_view_elapsed_seconds gauge",
+                f'beck_view_elapsed_seconds{{reel="{reel}"}} {time.perf_counter() - self.origin:.3f}',
+                "# HELP beck_view_stage_seconds_total Time spent in each stage, summed over all threads.",
+                "# TYPE beck_view_stage_seconds_total counter",
+            ]
+            lines += [f'beck_view_stage_seconds_total{{reel="{reel}",stage="{name}"}} {stage.seconds:.6f}'
+                      for name, stage in self._stages.items()]
+            lines += ["# HELP beck_view_stage_calls_total Calls of each stage.",
+                      "# TYPE beck_view_stage_calls_total counter"]
+            lines += [f'beck_view_stage_calls_total{{reel="{reel}",stage="{name}"}} {stage.calls}'
+                      for name, stage in self._stages.items()]
+            lines += ["# HELP beck_view_stage_max_seconds Longest call of each stage.",
+                      "# TYPE beck_view_stage_max_seconds gauge"]
+            lines += [f'beck_view_stage_max_seconds{{reel="{reel}",stage="{name}"}} {stage.max_seconds:.6f}'
+                      for name, stage in self._stages.items()]
+            lines += ["# HELP beck_view_queue_depth Items waiting in each queue.",
+                      "# TYPE beck_view_queue_depth gauge"]
+            lines += [f'beck_view_queue_depth{{reel="{reel}",queue="{name}"}} {gauge.last}'
+                      for name, gauge in self._gauges.items()]
+
+        # Write next to the file and rename, so the collector never reads half a file
+        temporary = self.prometheus_file.with_name(self.prometheus_file.name + ".tmp")
+        try:
+            temporary.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            os.replace(temporary, self.prometheus_file)
+        except OSError as e:
+            self.logger.warning(f"Could not write metrics to {str(self.prometheus_file)} - {e}")
+
+    def _write_trace(self) -> None:
+        def microseconds(t: float) -> float:
+            return round(1e6 * (t - self.origin), 1)
+
+        pid = os.getpid()
+        with self._lock:
+            events = [{"name": stage, "ph": "X", "ts": microseconds(start), "dur": round(1e6 * seconds, 1),
+                       "pid": record_pid, "tid": thread_id}
+                      for record_pid, (stage, start, seconds, thread_id) in self._records]
+            events += [{"name": "thread_name", "ph": "M", "pid": thread_pid, "tid": thread_id, "args": {"name": name}}
+                       for (thread_pid, thread_id), name in self._thread_names.items()]
+            events += [{"name": "queues", "ph": "C", "ts": microseconds(t), "pid": pid, "args": depths}
+                       for t, depths in self._counters]
+
+        try:
+            with open(self.trace_file, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            self.logger.info(f"Trace of {len(events)} events written to {str(self.trace_file)}")
+        except OSError as e:
+            self.logger.warning(f"Could not write trace to {str(self.trace_file)} - {e}")
+
+    def close(self) -> None:
+        """Stops reporting, logs a summary per stage and writes the Prometheus textfile and the trace."""
+        if self._reporter is not None:
+            self._stop.set()
+            self._reporter.join()
+            self._reporter = None
+        self._sample()
+
+        elapsed = time.perf_counter() - self.origin
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda item: -item[1].seconds)
+            gauges = list(self._gauges.items())
+        if stages:
+            # busy is the average number of threads in a stage; the stage closest to its thread count is the bottleneck
+            self.logger.info(f"{'stage':<16}{'calls':>8}{'total s':>10}{'avg ms':>10}{'max ms':>10}{'busy':>7}")
+            for name, stage in stages:
+                self.logger.info(f"{name:<16}{stage.calls:>8}{stage.seconds:>10.1f}"
+                                 f"{1000.0 * stage.seconds / stage.calls:>10.1f}{1000.0 * stage.max_seconds:>10.1f}"
+                                 f"{stage.seconds / elapsed if elapsed > 0 else 0.0:>7.2f}")
+        for name, gauge in gauges:
+            self.logger.info(f"Queue {name}: {gauge.total / max(1, gauge.samples):.1f} items on average, "
+                             f"at most {gauge.peak}")
+
+        self._write_prometheus()
+        if self.trace_file is not None:
+            self._write_trace()
+
+
+class ThreadProfiler:
+    """Profiles the calls of wrapped functions with one cProfile profiler per thread.
+
+    From Python 3.12 on, cProfile is built on sys.monitoring: only one profiler can be active in a
+    process, and it sees the calls of all threads. There the first wrapped call enables a single
+    profiler for the whole process, shared by all ThreadProfilers until the last of them is dumped.
+    """
+    # The process-wide profiler on Python 3.12 and later, and the number of ThreadProfilers using it
+    _shared: cProfile.Profile | None = None
+    _shared_users = 0
+    _shared_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+        self._uses_shared = False
+
+    def wrap(self, function: Callable) -> Callable:
+        if PROCESS_WIDE_PROFILER:
+            def run(*args):
+                if not self._uses_shared:
+                    self._start_shared()
+                return function(*args)
+
+            return run
+
+        def run(*args):
+            profile = getattr(self._local, "profile", None)
+            if profile is None:
+                profile = self._local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            return profile.runcall(function, *args)
+
+        return run
+
+    def _start_shared(self) -> None:
+        with ThreadProfiler._shared_lock:
+            if self._uses_shared:
+                return
+            # Checked only once, even if another profiling tool keeps the profiler from being enabled
+            self._uses_shared = True
+            if ThreadProfiler._shared is None:
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    # Another profiling tool is active, e.g. python -m cProfile
+                    return
+                ThreadProfiler._shared = profile
+            ThreadProfiler._shared_users += 1
+            with self._lock:
+                self._profiles.append(ThreadProfiler._shared)
+
+    def _stats(self) -> pstats.Stats | None:
+        if PROCESS_WIDE_PROFILER:
+            with ThreadProfiler._shared_lock:
+                with self._lock:
+                    if not self._profiles:
+                        return None
+                    profile = self._profiles.pop()
+                # Taking the statistics disables the profiler - enable it again for the ThreadProfilers still using it
+                stats = pstats.Stats(profile)
+                ThreadProfiler._shared_users -= 1
+                if ThreadProfiler._shared_users > 0:
+                    profile.enable()
+                else:
+                    ThreadProfiler._shared = None
+            return stats
+
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def dump(self, path: pathlib.Path, logger: logging.Logger, top: int = 15) -> None:
+        """Writes the statistics of all threads to ``path`` and logs the functions taking the most time."""
+        threads = "all threads" if PROCESS_WIDE_PROFILER else f"{len(self._profiles)} threads"
+        stats = self._stats()
+        if stats is None:
+            return
+
+        try:
+            stats.dump_stats(path)
+        except OSError as e:
+            logger.warning(f"Could not write profile to {str(path)} - {e}")
+            return
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+        logger.info(f"Profile of {threads} written to {str(path)} - "
+                    f"view it with python -m pstats or snakeviz\n{summary.getvalue()}")
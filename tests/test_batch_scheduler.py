@@ -0,0 +1,75 @@
+import json
+import os
+import pathlib
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from CommandLineParser import CommandLineParser
+from batchScheduler import BatchScheduler
+
+
+def scheduler(tmp_path: pathlib.Path, *options: str) -> BatchScheduler:
+    command_line_parser = CommandLineParser()
+    args = command_line_parser.parser.parse_args(["--batch", str(tmp_path / "jobs.txt"), *options])
+    return BatchScheduler(command_line_parser, args)
+
+
+def job_args(batch: BatchScheduler, job: str):
+    return batch._job_args(0, job.split(), threading.BoundedSemaphore(batch.cpus))
+
+
+def test_job_keeps_own_workers(tmp_path: pathlib.Path) -> None:
+    batch = scheduler(tmp_path, "--batch-cpus", "6")
+    assert job_args(batch, "-p scans/reel01 -n reel01 -w 3").num_workers == 3
+    assert job_args(batch, "-p scans/reel01 -n reel01 --workers 2").num_workers == 2
+    # Even when it asks for the number of workers of the batch command line
+    batch = scheduler(tmp_path, "--batch-cpus", "6", "-w", "3")
+    assert job_args(batch, "-p scans/reel01 -n reel01 -w 3").num_workers == 3
+
+
+def test_job_workers_default_to_cpus(tmp_path: pathlib.Path) -> None:
+    batch = scheduler(tmp_path, "--batch-cpus", "6")
+    args = job_args(batch, "-p scans/reel01 -n reel01.mp4 -b")
+    assert args.num_workers == 6
+    assert args.bracketing
+    assert args.path == pathlib.Path("scans/reel01")
+    assert args.job_name == "job1-reel01"
+    assert args.memory_share == batch.encoder_slots
+    assert args.batch is None
+
+    # -w of the batch command line is the default of the reels, but their workers only wait for CPU slots
+    batch = scheduler(tmp_path, "--batch-cpus", "6", "-w", "2")
+    assert job_args(batch, "-p scans/reel01 -n reel01").num_workers == 6
+
+
+def test_cpus_default(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 12)
+    assert scheduler(tmp_path).cpus == 12
+    assert scheduler(tmp_path, "--batch-cpus", "5").cpus == 5
+
+    monkeypatch.setattr(os, "cpu_count", lambda: None)
+    assert scheduler(tmp_path).cpus == 1
+    assert job_args(scheduler(tmp_path), "-p scans/reel01 -n reel01").num_workers == 1
+
+
+def test_sweep_job_counts_frames(tmp_path: pathlib.Path) -> None:
+    # Four bracketed frames, wide enough for the fixed crop of bracketed frames
+    scans = tmp_path / "scans"
+    scans.mkdir()
+    scene = np.tile(np.linspace(20, 200, 640, dtype=np.float32), (96, 1))[..., None].repeat(3, axis=2)
+    for frame in range(4):
+        for suffix, scale in zip("abc", (0.5, 1.0, 1.25)):
+            cv2.imwrite(str(scans / f"frame{frame:05d}{suffix}.png"), np.clip(scene * scale, 0, 255).astype(np.uint8))
+
+    (tmp_path / "jobs.txt").write_text(
+        f'-p "{scans}" -n reel01 -b --sweep default natural --sweep-frames 3\n', encoding="utf-8")
+    assert scheduler(tmp_path, "-o", str(tmp_path), "--batch-cpus", "2").run()
+
+    summary = json.loads((tmp_path / "jobs.summary.json").read_text(encoding="utf-8"))
+    assert summary["cpus"] == 2
+    [reel] = summary["reels"]
+    assert reel["status"] == "ok"
+    assert reel["frames"] == 3
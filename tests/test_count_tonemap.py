@@ -0,0 +1,96 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from createVideo import GenerateVideo
+
+# countTonemap agrees with the loop it replaced, run in float64, to within this many of 255 levels ...
+TOLERANCE_LEVELS = 0.02
+# ... except for pixels on a bin edge, which rounding may shift one bin more or less - at most this
+# fraction of all pixels. If nearly every bin is sparse the image is compacted into a bin or two and
+# normalizing stretches what is left of such a pixel to anywhere between 0 and 255.
+EDGE_FRACTION = 0.0005
+# The loop in float32, as it ran before, subtracts the bin width once per sparse bin and accumulates
+# its rounding errors - on merged frames it differs by more than 0.25 levels on a few hundred ppm of pixels.
+FLOAT32_TOLERANCE_LEVELS = 0.25
+FLOAT32_EDGE_FRACTION = 0.002
+
+
+def count_tonemap_loop(hdr: np.ndarray, min_fraction: float = 0.0005) -> np.ndarray:
+    """The loop over the histogram bins countTonemap replaced."""
+    counts, ranges = np.histogram(hdr, 256)
+    min_count = min_fraction * hdr.size
+    delta_range = ranges[1] - ranges[0]
+
+    image = hdr.copy()
+    for i in range(len(counts)):
+        if counts[i] < min_count:
+            image[image >= ranges[i + 1]] -= delta_range
+        ranges -= delta_range
+
+    return cv2.normalize(image, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX)
+
+
+class CountTonemapTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # countTonemap does not use the state of the generator
+        self.generator = GenerateVideo.__new__(GenerateVideo)
+        self.rng = np.random.default_rng(1)
+
+    def assert_equivalent(self, hdr: np.ndarray, min_fraction: float = 0.0005, levels: float = TOLERANCE_LEVELS,
+                          edge_fraction: float = EDGE_FRACTION) -> None:
+        reference = count_tonemap_loop(hdr.astype(np.float64), min_fraction)
+        result = self.generator.countTonemap(hdr.copy(), min_fraction)
+
+        self.assertEqual(result.shape, reference.shape)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertTrue(np.isfinite(result).all())
+        differing = np.count_nonzero(np.abs(result - reference) > levels) / result.size
+        self.assertLessEqual(differing, edge_fraction)
+
+    def lognormal(self, sigma: float) -> np.ndarray:
+        # Like merged frames: most pixels dark, a long and sparse tail of highlights
+        return self.rng.lognormal(0.0, sigma, (270, 480, 3)).astype(np.float32)
+
+    def test_lognormal(self) -> None:
+        for sigma in (0.5, 1.5, 3.0):
+            self.assert_equivalent(self.lognormal(sigma))
+
+    def test_float32_loop(self) -> None:
+        for sigma in (0.5, 1.5, 3.0):
+            hdr = self.lognormal(sigma)
+            reference = count_tonemap_loop(hdr.copy())
+            result = self.generator.countTonemap(hdr.copy())
+            differing = np.count_nonzero(np.abs(result - reference) > FLOAT32_TOLERANCE_LEVELS) / result.size
+            self.assertLessEqual(differing, FLOAT32_EDGE_FRACTION)
+
+    def test_uniform(self) -> None:
+        # No sparse bin - the image is only normalized
+        self.assert_equivalent(4.0 * self.rng.random((270, 480, 3), dtype=np.float32), edge_fraction=0.0)
+
+    def test_constant_image(self) -> None:
+        for value in (0.0, 0.7, 1e4):
+            self.assert_equivalent(np.full((90, 160, 3), value, np.float32), edge_fraction=0.0)
+
+    def test_all_bins_sparse(self) -> None:
+        for min_fraction in (0.5, 1.0):
+            for sigma in (0.5, 1.5, 3.0):
+                self.assert_equivalent(self.lognormal(sigma), min_fraction)
+            self.assert_equivalent(4.0 * self.rng.random((270, 480, 3), dtype=np.float32), min_fraction)
+
+    def test_values_on_bin_edges(self) -> None:
+        # Every value is one of the 257 histogram edges
+        hdr = np.repeat(np.linspace(0.0, 2.0, 257, dtype=np.float32), 48).reshape(257, 16, 3)
+        for min_fraction in (0.0005, 0.5, 1.0):
+            self.assert_equivalent(hdr, min_fraction, edge_fraction=0.0)
+
+    def test_two_levels_and_isolated_highlights(self) -> None:
+        self.assert_equivalent(np.where(self.rng.random((90, 160, 3)) < 0.5, 0.1, 5.0).astype(np.float32))
+        spikes = np.concatenate([np.zeros(30000), self.rng.lognormal(0.0, 3.0, 120)]).astype(np.float32)
+        self.assert_equivalent(spikes.reshape(1, -1, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import pathlib
+from types import SimpleNamespace
+
+from createVideo import GenerateVideo
+from encodeJournal import JOURNAL_VERSION, EncodeJournal
+
+PARAMETERS = {"frames": 12, "ranges": [[0, 4], [4, 8], [8, 12]]}
+
+
+def part_files(directory: pathlib.Path, k: int) -> list:
+    return [directory / f"video.part{k:05d}.mp4"]
+
+
+def encode_part(journal: EncodeJournal, directory: pathlib.Path, k: int, start: int, end: int) -> None:
+    # What a finished range leaves behind: its part files, then the journal entry
+    for part_file in part_files(directory, k):
+        part_file.write_bytes(b"part")
+    journal.commit(k, start, end, part_files(directory, k))
+
+
+def test_records_parts(tmp_path: pathlib.Path) -> None:
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+    encode_part(journal, tmp_path, 2, 8, 12)
+
+    assert journal.is_completed(0) and journal.is_completed(2)
+    assert not journal.is_completed(1)
+    data = json.loads(journal.path.read_text(encoding="utf-8"))
+    assert data["version"] == JOURNAL_VERSION
+    assert data["fingerprint"] == "abc"
+    assert data["parameters"] == PARAMETERS
+    assert data["completed"] == {
+        "0": {"start": 0, "end": 4, "files": ["video.part00000.mp4"]},
+        "2": {"start": 8, "end": 12, "files": ["video.part00002.mp4"]},
+    }
+    assert not journal.path.with_name(journal.path.name + ".tmp").exists()
+
+
+def test_start_clears_previous_run(tmp_path: pathlib.Path) -> None:
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    assert journal.completed == {}
+    assert json.loads(journal.path.read_text(encoding="utf-8"))["completed"] == {}
+
+
+def test_resumes_after_failed_part(tmp_path: pathlib.Path) -> None:
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+    # Range 1 fails - ffmpeg leaves a part file behind but the range is never committed
+    part_files(tmp_path, 1)[0].write_bytes(b"trunc")
+    encode_part(journal, tmp_path, 2, 8, 12)
+
+    resumed = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    assert resumed.load()
+    assert [k for k in range(3) if not resumed.is_completed(k)] == [1]
+
+    encode_part(resumed, tmp_path, 1, 4, 8)
+    assert all(resumed.is_completed(k) for k in range(3))
+    assert EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS).load()
+
+    resumed.remove()
+    assert not resumed.path.exists()
+
+
+def test_resume_skips_ranges_with_missing_parts(tmp_path: pathlib.Path) -> None:
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+    encode_part(journal, tmp_path, 1, 4, 8)
+    part_files(tmp_path, 0)[0].unlink()
+
+    resumed = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    assert resumed.load()
+    assert not resumed.is_completed(0)
+    assert resumed.is_completed(1)
+
+
+def test_rejects_stale_fingerprint(tmp_path: pathlib.Path) -> None:
+    journal = EncodeJournal(tmp_path / "video.journal.json", "abc", PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+
+    stale = EncodeJournal(tmp_path / "video.journal.json", "def", PARAMETERS)
+    assert not stale.load()
+    assert stale.completed == {}
+
+
+def test_rejects_other_version_and_broken_journal(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "video.journal.json"
+    assert not EncodeJournal(path, "abc", PARAMETERS).load()
+
+    path.write_text(json.dumps({"version": JOURNAL_VERSION - 1, "fingerprint": "abc", "completed": {}}),
+                    encoding="utf-8")
+    assert not EncodeJournal(path, "abc", PARAMETERS).load()
+
+    path.write_text('{"version": ', encoding="utf-8")
+    assert not EncodeJournal(path, "abc", PARAMETERS).load()
+
+
+def test_fingerprint_changes_with_input_files(tmp_path: pathlib.Path) -> None:
+    frames = [tmp_path / f"frame{i:05d}.png" for i in range(3)]
+    for frame in frames:
+        frame.write_bytes(b"frame")
+    # _fingerprint only reads the parameters, the response curve and the input files
+    generator = GenerateVideo.__new__(GenerateVideo)
+    generator.bracketing = False
+    generator.response = None
+    generator.source = SimpleNamespace(files=True)
+    generator.image_list = [str(frame) for frame in frames]
+
+    fingerprint = generator._fingerprint(PARAMETERS)
+    assert generator._fingerprint(dict(PARAMETERS)) == fingerprint
+    assert generator._fingerprint({**PARAMETERS, "frames": 13}) != fingerprint
+
+    journal = EncodeJournal(tmp_path / "video.journal.json", fingerprint, PARAMETERS)
+    journal.start()
+    encode_part(journal, tmp_path, 0, 0, 4)
+
+    stat = os.stat(frames[1])
+    os.utime(frames[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not EncodeJournal(journal.path, generator._fingerprint(PARAMETERS), PARAMETERS).load()
@@ -0,0 +1,115 @@
+import logging
+import os
+import pathlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from createVideo import GenerateVideo
+from frameCache import HEADER_SIZE, FrameCache
+
+SHAPE = (6, 8, 3)
+LOGGER = logging.getLogger("test_frame_cache")
+
+
+def frames(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (count,) + SHAPE, dtype=np.uint8)
+
+
+def store(cache: FrameCache, key: str, data: np.ndarray) -> bool:
+    writer = cache.create(key, len(data), SHAPE)
+    # Frames arrive out of order from the workers
+    for index in reversed(range(len(data))):
+        writer.write(index, data[index])
+    return writer.commit()
+
+
+def test_hit_reads_back_frames(tmp_path: pathlib.Path) -> None:
+    cache = FrameCache(tmp_path / "cache", 2 ** 20, LOGGER)
+    data = frames(5)
+    assert store(cache, "abc", data)
+
+    cached = cache.open("abc", 5, SHAPE)
+    assert isinstance(cached, np.memmap)
+    assert cached.shape == (5,) + SHAPE and cached.dtype == np.uint8
+    np.testing.assert_array_equal(cached, data)
+    np.testing.assert_array_equal(cached[2:4], data[2:4])
+    assert (tmp_path / "cache" / "abc.frames").stat().st_size == HEADER_SIZE + data.nbytes
+
+
+def test_miss(tmp_path: pathlib.Path) -> None:
+    cache = FrameCache(tmp_path / "cache", 2 ** 20, LOGGER)
+    assert cache.open("abc", 5, SHAPE) is None
+
+    assert store(cache, "abc", frames(5))
+    assert cache.open("abd", 5, SHAPE) is None
+    assert cache.open("abc", 4, SHAPE) is None
+    assert cache.open("abc", 5, (8, 6, 3)) is None
+    assert cache.open("abc", 5, (9, 8)) is None
+
+
+def test_incomplete_store_is_a_miss(tmp_path: pathlib.Path) -> None:
+    cache = FrameCache(tmp_path / "cache", 2 ** 20, LOGGER)
+    data = frames(5)
+
+    # Interrupted while writing - the header is not marked complete yet
+    writer = cache.create("abc", 5, SHAPE)
+    writer.write(0, data[0])
+    writer.frames.flush()
+    assert cache.open("abc", 5, SHAPE) is None
+
+    # A missing frame leaves the store incomplete, so commit removes it
+    assert not writer.commit()
+    assert not (tmp_path / "cache" / "abc.frames").exists()
+
+    # So does a frame of another size
+    writer = cache.create("abc", 5, SHAPE)
+    for index in range(5):
+        writer.write(index, data[index] if index != 3 else data[index, :4])
+    assert not writer.commit()
+    assert cache.open("abc", 5, SHAPE) is None
+
+    writer = cache.create("abc", 5, SHAPE)
+    writer.discard()
+    assert not (tmp_path / "cache" / "abc.frames").exists()
+
+
+def test_changed_source_invalidates(tmp_path: pathlib.Path) -> None:
+    paths = [tmp_path / f"frame{i:05d}.png" for i in range(3)]
+    for path in paths:
+        path.write_bytes(b"frame")
+    # The key of a store is the fingerprint of the input files and processing settings
+    generator = GenerateVideo.__new__(GenerateVideo)
+    generator.bracketing = False
+    generator.response = None
+    generator.source = SimpleNamespace(files=True)
+    generator.image_list = [str(path) for path in paths]
+    parameters = {"width": 8, "height": 6, "tone_mapper": "reinhard"}
+
+    cache = FrameCache(tmp_path / "cache", 2 ** 20, LOGGER)
+    assert store(cache, generator._fingerprint(parameters), frames(3))
+    assert cache.open(generator._fingerprint(parameters), 3, SHAPE) is not None
+    assert cache.open(generator._fingerprint({**parameters, "tone_mapper": "drago"}), 3, SHAPE) is None
+
+    paths[1].write_bytes(b"retouched frame")
+    assert cache.open(generator._fingerprint(parameters), 3, SHAPE) is None
+
+
+def test_evicts_least_recently_used(tmp_path: pathlib.Path) -> None:
+    size = HEADER_SIZE + frames(4).nbytes
+    cache = FrameCache(tmp_path / "cache", 2 * size, LOGGER)
+    assert store(cache, "first", frames(4, 1))
+    assert store(cache, "second", frames(4, 2))
+    os.utime(tmp_path / "cache" / "first.frames", (1, 1))
+    os.utime(tmp_path / "cache" / "second.frames", (2, 2))
+
+    # Opening a store marks it as recently used
+    assert cache.open("first", 4, SHAPE) is not None
+    assert store(cache, "third", frames(4, 3))
+    assert sorted(p.stem for p in (tmp_path / "cache").glob("*.frames")) == ["first", "third"]
+
+
+def test_reel_larger_than_limit(tmp_path: pathlib.Path) -> None:
+    cache = FrameCache(tmp_path / "cache", HEADER_SIZE + frames(4).nbytes, LOGGER)
+    assert cache.create("abc", 5, SHAPE) is None
+    assert not list((tmp_path / "cache").glob("*.frames"))
@@ -0,0 +1,98 @@
+import json
+import pathlib
+
+import cv2
+import numpy as np
+import pytest
+
+from createVideo import GenerateVideo
+from frameStream import ArraySource, CallbackSink, NullSink, RawFileSink
+
+SHAPE = (120, 160, 3)
+
+
+def images(count: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, SHAPE, dtype=np.uint8) for _ in range(count)]
+
+
+def generator(source_images: list, tmp_path: pathlib.Path, **options) -> GenerateVideo:
+    return GenerateVideo.from_options(ArraySource(source_images), opath=tmp_path, name="reel", **options)
+
+
+def test_from_options(tmp_path: pathlib.Path) -> None:
+    video = generator(images(2), tmp_path, num_workers=2, fps=24.0)
+    assert video.num_workers == 2
+    assert video.fps == 24.0
+    assert (video.width, video.height) == (SHAPE[1], SHAPE[0])
+    assert not video.source.files
+
+    with pytest.raises(TypeError, match="no_such_option"):
+        generator(images(2), tmp_path, no_such_option=1)
+
+
+def test_array_source_to_callback_sink(tmp_path: pathlib.Path) -> None:
+    source_images = images(5)
+    video = generator(source_images, tmp_path)
+    frames = []
+    # Frames may be views of buffers that are reused - the sink keeps copies
+    assert video.write_frames(CallbackSink(lambda frame: frames.append(frame.copy()))) == 5
+    assert video.frames_written == 5
+
+    assert len(frames) == 5
+    for image, frame in zip(source_images, frames):
+        np.testing.assert_array_equal(frame, cv2.flip(image, video.flip))
+    assert not (tmp_path / "reel.duplicates.json").exists()
+
+
+def test_iter_frames(tmp_path: pathlib.Path) -> None:
+    source_images = images(4)
+    video = generator(source_images, tmp_path)
+    frames = [frame.copy() for frame in video.iter_frames()]
+
+    assert len(frames) == 4
+    for image, frame in zip(source_images, frames):
+        np.testing.assert_array_equal(frame, cv2.flip(image, video.flip))
+
+
+def test_bracketed_array_source(tmp_path: pathlib.Path) -> None:
+    # Two frames of three exposures each, wide enough for the fixed crop of bracketed frames
+    scene = np.tile(np.linspace(20, 200, 640, dtype=np.float32), (96, 1))[..., None].repeat(3, axis=2)
+    exposures = [np.clip(scene * scale, 0, 255).astype(np.uint8) for _ in range(2) for scale in (0.5, 1.0, 1.25)]
+    sink = NullSink()
+
+    assert generator(exposures, tmp_path, bracketing=True).write_frames(sink) == 2
+    assert sink.frames == 2
+    assert sink.bytes == 2 * 96 * 640 * 3
+    # Frames in memory have no directory to keep the camera response in
+    assert not (tmp_path / "camera_response.json").exists()
+
+
+def test_raw_file_sink(tmp_path: pathlib.Path) -> None:
+    source_images = images(3)
+    video = generator(source_images, tmp_path)
+    assert video.write_frames(RawFileSink(tmp_path / "reel.bgr")) == 3
+
+    raw = np.fromfile(tmp_path / "reel.bgr", dtype=np.uint8).reshape((3,) + SHAPE)
+    for image, frame in zip(source_images, raw):
+        np.testing.assert_array_equal(frame, cv2.flip(image, video.flip))
+
+
+def test_write_frames_reports_duplicates(tmp_path: pathlib.Path) -> None:
+    # The projector stood still on frames 2 to 4
+    source_images = images(3)
+    source_images[3:3] = [source_images[2].copy(), source_images[2].copy()]
+    video = generator(source_images, tmp_path, duplicate_tolerance=1.0)
+    frames = []
+    assert video.write_frames(CallbackSink(lambda frame: frames.append(frame.copy()))) == 5
+
+    np.testing.assert_array_equal(frames[3], frames[2])
+    np.testing.assert_array_equal(frames[4], frames[2])
+    report = json.loads((tmp_path / "reel.duplicates.json").read_text(encoding="utf-8"))
+    assert report == {
+        "tolerance": 1.0,
+        "frames": 5,
+        "reused": 2,
+        "runs": [{"first": "frame 3", "last": "frame 4", "first_index": 3, "last_index": 4,
+                  "frames": 2, "shows": "frame 2"}],
+    }
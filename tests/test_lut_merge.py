@@ -0,0 +1,59 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from createVideo import LutMergeDebevec
+
+# Relative difference to cv2.MergeDebevec - both sum the same float32 terms, in a different order
+RELATIVE_TOLERANCE = 1e-5
+
+
+class LutMergeDebevecTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(1)
+        self.times = np.array([0.25, 1.0, 4.0], dtype=np.float32)
+        # A monotonic camera response like a calibrated one, different for every channel
+        levels = np.linspace(0.02, 1.0, 256, dtype=np.float32)[:, None]
+        self.response = (np.power(levels, np.array([[2.0, 2.2, 2.4]], dtype=np.float32)) * 8.0).reshape(256, 1, 3)
+
+    def exposures(self, height: int = 120, width: int = 160) -> list:
+        scene = self.rng.lognormal(0.0, 1.5, (height, width, 3))
+        return [np.clip(scene * t * 40.0, 0, 255).astype(np.uint8) for t in self.times]
+
+    def assert_matches_opencv(self, images: list) -> None:
+        expected = cv2.createMergeDebevec().process(images, self.times, self.response)
+        result = LutMergeDebevec(self.times, self.response).process(images)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertEqual(result.dtype, np.float32)
+        np.testing.assert_allclose(result, expected, rtol=RELATIVE_TOLERANCE, atol=0.0)
+
+    def test_random_exposures(self) -> None:
+        self.assert_matches_opencv(self.exposures())
+
+    def test_black_and_saturated_pixels(self) -> None:
+        # No weight in any exposure - both fall back to the unweighted mean
+        images = self.exposures()
+        images[0][:10] = 0
+        images[1][:10] = 0
+        images[2][:10] = 0
+        for image in images:
+            image[-10:] = 255
+        self.assert_matches_opencv(images)
+
+    def test_cropped_views(self) -> None:
+        # The exposures of a frame are crops of the decoded images, not contiguous arrays
+        images = [image[5:-5, 20:-20] for image in self.exposures()]
+        self.assertFalse(images[0].flags.c_contiguous)
+        self.assert_matches_opencv(images)
+
+    def test_buffers_are_reused(self) -> None:
+        merge = LutMergeDebevec(self.times, self.response)
+        first = merge.process(self.exposures())
+        second = merge.process(self.exposures())
+        self.assertIs(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
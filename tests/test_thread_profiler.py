@@ -0,0 +1,67 @@
+import logging
+import pathlib
+import pstats
+import tempfile
+import threading
+import unittest
+
+from stageMetrics import ThreadProfiler
+
+
+def _work(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+class ThreadProfilerTest(unittest.TestCase):
+
+    def test_concurrent_threads(self) -> None:
+        # All four calls overlap - from Python 3.12 on only one profiler can be active per process
+        profiler = ThreadProfiler()
+        wrapped = profiler.wrap(self._overlapping)
+        barrier = threading.Barrier(4, timeout=10)
+        results = [None] * 4
+        errors = []
+
+        def run(k: int) -> None:
+            try:
+                results[k] = wrapped(barrier, 20000 + k)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(k,)) for k in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [_work(20000 + k) for k in range(4)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory) / "profile.prof"
+            profiler.dump(path, logging.getLogger("test"))
+            functions = {function for _, _, function in pstats.Stats(str(path)).stats}
+        self.assertIn("_work", functions)
+
+    def test_profilers_of_two_reels(self) -> None:
+        # Reels of a batch run side by side in one process, each with its own profiler
+        first, second = ThreadProfiler(), ThreadProfiler()
+        self.assertEqual(first.wrap(_work)(1000), _work(1000))
+        self.assertEqual(second.wrap(_work)(1000), _work(1000))
+        with tempfile.TemporaryDirectory() as directory:
+            first.dump(pathlib.Path(directory) / "first.prof", logging.getLogger("test"))
+            self.assertEqual(second.wrap(_work)(1000), _work(1000))
+            second.dump(pathlib.Path(directory) / "second.prof", logging.getLogger("test"))
+            self.assertTrue((pathlib.Path(directory) / "first.prof").is_file())
+            self.assertTrue((pathlib.Path(directory) / "second.prof").is_file())
+
+    @staticmethod
+    def _overlapping(barrier: threading.Barrier, n: int) -> int:
+        barrier.wait()
+        result = _work(n)
+        barrier.wait()
+        return result
+
+
+if __name__ == "__main__":
+    unittest.main()